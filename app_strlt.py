@@ -1,20 +1,135 @@
 import streamlit as st
-from config import system_prompt
-from react_agent import process_user_query_react
+from config import runtime
+from react_agent import process_session_query, registry
+from tracing import RunTrace, metrics
+from warmup import warmup
 import json
+import math
+import textwrap
+import uuid
+
+# Messages shown per history page and characters shown per message preview
+HISTORY_PAGE_SIZE = 20
+PREVIEW_CHARS = 500
+
+def current_session_id() -> str:
+    """Session id kept in the URL (?session=...), so a reload or a server restart resumes the conversation."""
+    if "session_id" not in st.session_state:
+        session_id = st.query_params.get("session")
+        if not session_id:
+            session_id = uuid.uuid4().hex
+            st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+    return st.session_state.session_id
 
 def reset_session():
-    st.session_state.messages = [{"role": "system", "content": system_prompt}]
-    st.session_state.step = 0
-    st.session_state.session_active = True
+    runtime.session_store.clear(current_session_id())
+    st.session_state.pop("last_trace", None)
+
+def message_preview(msg: dict) -> str:
+    content = msg.get("content") or ""
+    if msg.get("tool_calls"):
+        calls = ", ".join(f"{tc['function']['name']}({tc['function']['arguments']})" for tc in msg["tool_calls"])
+        content = f"{content}\n→ {calls}".strip()
+    if len(content) > PREVIEW_CHARS:
+        content = content[:PREVIEW_CHARS] + f"… [{len(content) - PREVIEW_CHARS} more characters]"
+    return content
+
+def message_json(msg: dict) -> str:
+    return textwrap.indent(json.dumps(msg, indent=2), "  ")
+
+@st.fragment
+def render_history():
+    """Paginated history and raw JSON, built only while their toggles are on.
+
+    Runs as a fragment, so paging and toggling do not rerun the whole app.
+    Only the shown page is read from the session store; the full JSON
+    download is built when its button is clicked.
+    """
+    show_history = st.toggle("Show short conversation history")
+    show_json = st.toggle("Show raw conversation JSON")
+    if not (show_history or show_json):
+        return
+
+    store = runtime.session_store
+    session_id = current_session_id()
+    total = store.count(session_id)
+    pages = max(1, math.ceil(total / HISTORY_PAGE_SIZE))
+    page = st.number_input("History page", min_value=1, max_value=pages, value=pages) if pages > 1 else 1
+    start = (page - 1) * HISTORY_PAGE_SIZE
+    messages = store.page(session_id, start, start + HISTORY_PAGE_SIZE)
+
+    if show_history:
+        for i, msg in enumerate(messages, start):
+            st.write(f"{i+1}. **{msg.get('role', 'unknown').capitalize()}:**")
+            st.text(message_preview(msg))
+
+    if show_json:
+        st.code("[\n" + ",\n".join(message_json(msg) for msg in messages) + "\n]", language="json")
+        # The whole conversation is read and serialized only on request
+        if st.button("Prepare the full conversation JSON"):
+            full = "[\n" + ",\n".join(message_json(msg) for msg in store.page(session_id, 0, total)) + "\n]"
+            st.download_button("Download the full conversation JSON", full,
+                               file_name="conversation.json", mime="application/json")
+
+def render_trace(trace: dict):
+    totals = trace["totals"]
+    st.write(
+        f"**{totals['steps']} steps** in {totals['duration_ms']:.0f} ms "
+        f"(LLM {totals['llm_ms']:.0f} ms), {totals['tool_calls']} tool calls, "
+        f"{totals['prompt_tokens']} prompt / {totals['completion_tokens']} completion tokens"
+    )
+    rows = []
+    for step in trace["steps"]:
+        rows.append({
+            "step": step["index"] + 1,
+            "span": "LLM",
+            "ms": round(step["llm_latency_ms"], 1),
+            "tokens in/out": f"{step['prompt_tokens']}/{step['completion_tokens']}",
+            "payload chars": step["request_chars"],
+            "error": "",
+        })
+        for tool in step["tools"]:
+            rows.append({
+                "step": step["index"] + 1,
+                "span": tool["name"],
+                "ms": round(tool["duration_ms"], 1),
+                "tokens in/out": "",
+                "payload chars": tool["result_chars"],
+                "error": tool["error"] or ("truncated" if tool.get("truncated") else ""),
+            })
+    st.dataframe(rows, hide_index=True)
+    # Observations cut to their budget can be shown in full while the result is still stored
+    truncated = [tool for step in trace["steps"] for tool in step["tools"] if tool.get("truncated")]
+    for tool in truncated:
+        result = runtime.result_store.get(tool["tool_call_id"])
+        if result is not None:
+            with st.expander(f"Full result of {tool['name']} ({tool['tool_call_id']})"):
+                st.json(result, expanded=False)
+    st.caption("Process-wide latency percentiles (ms)")
+    st.json(metrics.summary()["latency"], expanded=False)
+    st.caption("Memoized tool results")
+    st.json(registry.stats(), expanded=False)
+    st.caption("Cached answers")
+    st.json(runtime.answer_cache.stats(), expanded=False)
+
+def render_warmup():
+    """Warm-up progress in the sidebar; questions are answered meanwhile, without waiting for it."""
+    status = warmup.status()
+    if status["state"] == "ready":
+        return
+    with st.sidebar:
+        if status["state"] == "running":
+            st.progress(status["done"] / max(1, status["total"]),
+                        text=f"Warming up: {status['current'] or '…'} ({status['done']}/{status['total']})")
+        elif status["state"] == "failed":
+            st.warning("Warm-up incomplete; affected data is loaded on first use.")
+            st.json(status["steps"], expanded=False)
 
 def main():
-    if "messages" not in st.session_state:
-        st.session_state.messages = [{"role": "system", "content": system_prompt}]
-    if "step" not in st.session_state:
-        st.session_state.step = 0
-    if "session_active" not in st.session_state:
-        st.session_state.session_active = True
+    warmup.start()
+    session_id = current_session_id()
+    state = runtime.session_store.state(session_id)
 
     st.title("AI Data Analyst Chat")
 
@@ -39,41 +154,39 @@ def main():
 
     if st.button("Restart Session"):
         reset_session()
+        state = runtime.session_store.state(session_id)
 
 
-    if st.session_state.session_active:
+    if state["active"]:
         with st.form(key="input_form", clear_on_submit=True):
             user_input = st.text_input("Enter your question:")
+            plan_mode = st.checkbox("Plan all tool calls in one step (plan-and-execute)")
             submit = st.form_submit_button("Send")
 
         if submit and user_input:
-            st.session_state.messages.append({"role": "user", "content": user_input})
-
-            answer, updated_messages = process_user_query_react(st.session_state.messages)
-
-            st.session_state.messages = updated_messages
-            st.session_state.step += 1
+            trace = RunTrace(question=user_input)
+            answer = process_session_query(session_id, user_input, trace=trace,
+                                           mode="plan" if plan_mode else "react")
+            st.session_state.last_trace = trace.to_dict()
+            state["step"] += 1
 
             st.markdown(f"**You:** {user_input}")
             st.markdown(f"**AI_Agent:** {answer}")
 
-            if st.session_state.step >= 10:
+            if state["step"] >= 10:
                 st.warning("Reached the maximum of 10 interaction steps. Please restart the session.")
-                st.session_state.session_active = False
+                state["active"] = False
+            runtime.session_store.set_state(session_id, state["step"], state["active"])
     else:
         st.info("Session ended. Please press 'Restart Session' to start a new conversation.")
 
     st.write("---")
 
-    with st.expander("Show short conversation history"):
-        for i, msg in enumerate(st.session_state.messages):
-            role = msg.get("role", "unknown").capitalize()
-            content = msg.get("content", "")
-            st.write(f"{i+1}. **{role}:**")
-            st.text_area("", value=content, height=80, key=f"history_{i}")
+    render_history()
 
-    with st.expander("Show raw conversation JSON"):
-        st.code(json.dumps(st.session_state.messages, indent=2), language="json")
+    if st.session_state.get("last_trace"):
+        with st.expander("Show trace for the last question"):
+            render_trace(st.session_state.last_trace)
 
 
 if __name__ == "__main__":
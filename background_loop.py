@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """Event loop running forever in a daemon thread.
+
+    Synchronous callers (Streamlit sessions, scripts) submit coroutines here,
+    so every conversation in the process shares one loop and one async
+    connection pool instead of creating a loop per request.
+    """
+
+    def __init__(self, name: str = "agent-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the loop and wait for its result; cancel it on timeout."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() cannot be called from the loop thread")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
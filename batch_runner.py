@@ -0,0 +1,121 @@
+"""Headless batch mode: answer a JSONL file of questions with the ReAct agent.
+
+Each input line is {"id": ..., "question": ...} (id defaults to the line
+number). Every answer is appended to the output JSONL as soon as it is
+ready, with per-item stats. Items already answered successfully in the
+output file are skipped, so an interrupted run resumes where it stopped:
+
+    python batch_runner.py questions.jsonl answers.jsonl --concurrency 16 --rpm 500 --tpm 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from config import runtime, system_prompt
+from llm_client import RequestScheduler
+from react_agent import AGENT_MODES, aprocess_user_query_react
+from tracing import RunTrace
+
+
+def read_questions(path: str) -> list:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            questions.append({"id": item.get("id", line_number), "question": item["question"]})
+    return questions
+
+
+def answered_ids(path: str) -> set:
+    """Ids answered successfully in an existing output file (the checkpoint)."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partially written last line of an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+async def answer_question(item: dict, timeout: float, mode: str = None) -> dict:
+    trace = RunTrace(question=item["question"])
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": item["question"]}]
+    record = {"id": item["id"], "question": item["question"]}
+    try:
+        answer, _ = await asyncio.wait_for(aprocess_user_query_react(messages, trace=trace, session_id="batch", mode=mode), timeout)
+        record.update(status="ok", answer=answer)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["stats"] = trace.totals()
+    return record
+
+
+async def run_batch(questions: list, output_path: str, concurrency: int = 8, requests_per_minute: float = None,
+                    timeout: float = 300, tokens_per_minute: float = None, mode: str = None) -> dict:
+    """Answer `questions` with at most `concurrency` conversations in flight, streaming results to `output_path`.
+
+    LLM requests go through the shared scheduler; `requests_per_minute` and
+    `tokens_per_minute` replace its limits for this run.
+    """
+    if requests_per_minute or tokens_per_minute:
+        scheduler = runtime.llm_scheduler
+        runtime.configure(llm_scheduler=RequestScheduler(
+            max_in_flight=scheduler.max_in_flight,
+            requests_per_minute=requests_per_minute or scheduler.requests.capacity,
+            tokens_per_minute=tokens_per_minute or scheduler.tokens.capacity,
+        ))
+
+    queue = asyncio.Queue()
+    for item in questions:
+        queue.put_nowait(item)
+    counts = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        async def worker():
+            while not queue.empty():
+                item = queue.get_nowait()
+                record = await answer_question(item, timeout, mode)
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts[record["status"]] += 1
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    elapsed = time.perf_counter() - started
+    return {**counts, "seconds": round(elapsed, 2),
+            "questions_per_second": round(len(questions) / elapsed, 2) if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file with questions")
+    parser.add_argument("output", help="JSONL file for answers (appended; used as checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8, help="conversations in flight")
+    parser.add_argument("--rpm", type=float, help="client-side limit on LLM requests per minute")
+    parser.add_argument("--tpm", type=float, help="client-side limit on LLM tokens per minute")
+    parser.add_argument("--mode", choices=AGENT_MODES, help="agent mode (default: AGENT_MODE or react)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per question")
+    args = parser.parse_args()
+
+    questions = read_questions(args.input)
+    done = answered_ids(args.output)
+    pending = [item for item in questions if item["id"] not in done]
+    print(f"{len(questions)} questions, {len(done)} already answered, {len(pending)} to run", file=sys.stderr)
+
+    summary = asyncio.run(run_batch(pending, args.output, args.concurrency, args.rpm, args.timeout, args.tpm, args.mode))
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
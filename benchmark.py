@@ -0,0 +1,236 @@
+"""Offline benchmark of the agent loop and the tools.
+
+Runs scripted scenarios through the async agent, in ReAct and in
+plan-and-execute mode and behind the fast path (template answers and the
+answer cache), against a local mock of the chat completions API,
+and measures the throughput of every tool function on the real dataset.
+Prints (or writes) one JSON document so results can be compared across
+commits and modes:
+
+    python benchmark.py --iterations 20 --concurrency 4 --latency-ms 50 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import Counter
+
+from config import LABEL_ENUMS, TOOL_DEFINITIONS, runtime, system_prompt
+from fast_path import AnswerCache
+from history import approx_tokens
+from llm_cache import LLMCache
+from mock_llm import mock_clients, tool_call
+from model import FunctionInput, IntentClass
+from react_agent import AGENT_MODES, aprocess_user_query_react, execute_function, registry
+from tool_schema import label_prompt, tool_tokens, tools_digest
+from tracing import RunTrace, percentile
+
+# Scripted conversations: question -> tool-call turns followed by the final answer
+SCENARIOS = {
+    "What categories exist?": [
+        [tool_call("get_dataset_overview")],
+        "The dataset has 11 categories.",
+    ],
+    "How many customers complain?": [
+        [tool_call("select_semantic_intent", query="complaint")],
+        [tool_call("count_intent", intent_class="complaint")],
+        "About 1000 records are complaints.",
+    ],
+    "Show 3 examples of responses for Category CANCEL": [
+        [tool_call("show_examples", target_field="response", condition_field="category",
+                   condition_field_value="CANCEL", number_rows=3)],
+        "Here are three examples.",
+    ],
+    "What is Intent distribution?": [
+        [tool_call("value_distribution", field="intent")],
+        "Here is the intent distribution.",
+    ],
+    "What is Intent distribution? (one count per intent)": [
+        [tool_call("count_intent", intent_class=intent.value) for intent in IntentClass],
+        "Here is the intent distribution.",
+    ],
+    "Summarize how the agent responds to Intent complaint": [
+        [tool_call("summarize_text", text_field="response", condition_field="intent",
+                   condition_field_value="complaint", number_rows=50)],
+        "Responses apologize and offer help.",
+    ],
+}
+
+# Representative inputs for measuring the tools on the dataset
+TOOL_INPUTS = [
+    {"function_type": "get_dataset_overview"},
+    {"function_type": "select_semantic_intent", "query": "I want to cancel my order"},
+    {"function_type": "select_semantic_category", "query": "where is my refund"},
+    {"function_type": "count_intent", "intent_class": "complaint"},
+    {"function_type": "count_category", "category_class": "ACCOUNT"},
+    {"function_type": "value_distribution", "field": "intent", "condition_field": "category", "condition_field_value": "ACCOUNT"},
+    {"function_type": "intent_category_crosstab"},
+    {"function_type": "search_text", "query": '"track order" OR refund -cancel', "number_rows": 3},
+    {"function_type": "sum_values", "values": [1.5, 2.5, 3.0]},
+    {"function_type": "multiplication_float", "a": 3.0, "b": 4.0},
+    {"function_type": "division_float", "numerator": 3.0, "denominator": 4.0},
+    {"function_type": "show_examples", "condition_field": "intent", "condition_field_value": "get_refund", "number_rows": 5},
+    {"function_type": "summarize_text", "text_field": "response", "condition_field": "category",
+     "condition_field_value": "REFUND", "number_rows": 100},
+    {"function_type": "finish"},
+]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latency_summary(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 0.50), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+async def run_scenario(question: str, iterations: int, concurrency: int, mode: str = "react",
+                       fast_path: bool = False) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    traces = []
+
+    async def run_once():
+        async with semaphore:
+            trace = RunTrace(question=question)
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": question}]
+            await aprocess_user_query_react(messages, trace=trace, mode=mode, fast_path=fast_path)
+            traces.append(trace)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_once() for _ in range(iterations)))
+    elapsed = time.perf_counter() - started
+
+    totals = [trace.totals() for trace in traces]
+    return {
+        "iterations": iterations,
+        "latency_ms": latency_summary([t["duration_ms"] for t in totals]),
+        "llm_ms": latency_summary([t["llm_ms"] for t in totals]),
+        "steps": totals[0]["steps"],
+        "tool_calls": totals[0]["tool_calls"],
+        "prompt_tokens": totals[0]["prompt_tokens"],
+        "completion_tokens": totals[0]["completion_tokens"],
+        "runs_per_second": round(iterations / elapsed, 2),
+        "plan_fallbacks": sum(1 for trace in traces if trace.fallback),
+        "served_by": dict(Counter(trace.mode for trace in traces)),
+    }
+
+
+def time_calls(function_call, seconds: float, memoize: bool) -> dict:
+    calls, started = 0, time.perf_counter()
+    while True:
+        execute_function(function_call, memoize=memoize)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            break
+    return {"calls": calls, "calls_per_second": round(calls / elapsed, 1), "mean_us": round(elapsed / calls * 1e6, 1)}
+
+
+def benchmark_tools(seconds_per_tool: float) -> dict:
+    """Time every tool computed on each call and, for deterministic tools, served from the memo."""
+    results = {}
+    for arguments in TOOL_INPUTS:
+        function_call = FunctionInput(function_call=arguments).function_call
+        execute_function(function_call)  # warm up lazily built resources and the memo
+        result = time_calls(function_call, seconds_per_tool, memoize=False)
+        if registry.tool(function_call).deterministic:
+            result["memoized_mean_us"] = time_calls(function_call, seconds_per_tool, memoize=True)["mean_us"]
+        results[arguments["function_type"]] = result
+    return results
+
+
+def tool_schema_report() -> dict:
+    """Prompt tokens of the compiled tool definitions (and the label list they refer to) against the raw pydantic schemas."""
+    raw = [{"type": "function", "function": {"name": name, "description": description,
+                                             "parameters": model.model_json_schema()}}
+           for name, (description, model) in TOOL_DEFINITIONS.items()]
+    tokens = tool_tokens(runtime.tools)
+    return {
+        "digest": tools_digest(runtime.tools),
+        "total_tokens": sum(tokens.values()),
+        "label_prompt_tokens": approx_tokens(label_prompt(LABEL_ENUMS)),
+        "model_json_schema_tokens": sum(tool_tokens(raw).values()),
+        "tokens": tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10, help="runs per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent runs per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency of every LLM call")
+    parser.add_argument("--mode", choices=[*AGENT_MODES, "both"], default="both",
+                        help="agent mode(s) to run the scenarios in")
+    parser.add_argument("--tool-seconds", type=float, default=0.5, help="measuring time per tool")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    client, async_client = mock_clients(SCENARIOS, args.latency_ms)
+    runtime.configure(
+        client=client,
+        async_client=async_client,
+        classification_cache=LLMCache(":memory:", table="classification"),
+        summary_cache=LLMCache(":memory:", table="summary"),
+        answer_cache=AnswerCache(LLMCache(":memory:", table="answers")),
+    )
+
+    started = time.perf_counter()
+    backend = runtime.backend
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    runtime.classifiers
+    classifier_seconds = time.perf_counter() - started
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "dataset_backend": type(backend).__name__,
+            "dataset_version": backend.version,
+            "dataset_rows": len(backend),
+            "dataset_load_seconds": round(load_seconds, 3),
+            "classifier_build_seconds": round(classifier_seconds, 3),
+            "llm_latency_ms": args.latency_ms,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": {
+            mode: {
+                question: asyncio.run(run_scenario(question, args.iterations, args.concurrency, mode))
+                for question in SCENARIOS
+            }
+            for mode in (AGENT_MODES if args.mode == "both" else [args.mode])
+        },
+        # The same scenarios with the template router and the answer cache in front of the agent
+        "fast_path": {
+            question: asyncio.run(run_scenario(question, args.iterations, 1, fast_path=True))
+            for question in SCENARIOS
+        },
+        "tools": benchmark_tools(args.tool_seconds),
+        "tool_schema": tool_schema_report(),
+    }
+    report["tool_memo"] = registry.stats()
+    report["answer_cache"] = runtime.answer_cache.stats()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
-import pandas as pd
-import streamlit as st
-from openai import OpenAI
+import asyncio
+import os
+import threading
+import time
+import weakref
 from model import (
                    DatasetOverview, 
                    SelectSemanticIntent, 
                    SelectSemanticCategory, 
                    CountIntent, CountCategory, 
+                   ValueDistribution, 
+                   IntentCategoryCrosstab, 
+                   SearchText, 
                    SumValues, 
                    MultiplicationFloat, 
                    DivisionFloat, 
@@ -13,117 +18,373 @@ from model import (
                    SummarizeText, 
                    Finish,
                    FunctionType, 
-                   FunctionInput 
+                   FunctionInput,
+                   CategoryClass,
+                   IntentClass
                    )
+from tool_schema import label_prompt
 
-# Initialize the variable with the data set as a data frame
-@st.cache_data
+# Define name of LLM model
+model_name = "gpt-4o-mini"
+
+# Name, description and input model of every tool the agent can call
+TOOL_DEFINITIONS = {
+    "get_dataset_overview": (
+        "Get name of dataset, total number of rows and column names",
+        DatasetOverview,
+    ),
+    "select_semantic_intent": (
+        "Uses LLM to select the most appropriate intent based on a text description",
+        SelectSemanticIntent,
+    ),
+    "select_semantic_category": (
+        "Uses LLM to select the most appropriate category based on a text description",
+        SelectSemanticCategory,
+    ),
+    "count_intent": (
+        "Count how many records match the selected Intent class",
+        CountIntent,
+    ),
+    "count_category": (
+        "Count how many records match the selected Category class",
+        CountCategory,
+    ),
+    "value_distribution": (
+        "Get the distribution of intents or categories in one call: rows and share per value, sorted by frequency. Supports top_k and filtering by the other field",
+        ValueDistribution,
+    ),
+    "intent_category_crosstab": (
+        "Get the number of rows for every intent within every category, or within one category",
+        IntentCategoryCrosstab,
+    ),
+    "search_text": (
+        "Full-text search in instruction (default) or response texts: count matching rows and show examples. Words are combined with AND; supports OR, -word or NOT word, and \"quoted phrases\". Can be combined with an intent or category condition",
+        SearchText,
+    ),
+    "sum_values": (
+        "Calculate the sum of a list of numeric values",
+        SumValues,
+    ),
+    "multiplication_float": (
+        "Calculate the multiplication of two floats",
+        MultiplicationFloat,
+    ),
+    "division_float": (
+        "Calculate the division of two floats",
+        DivisionFloat,
+    ),
+    "show_examples": (
+        "Display N random examples from the dataset with optionally filtered field. Use page 1, 2, ... with the same arguments to show further, non-repeating examples",
+        ShowExamples,
+    ),
+    "summarize_text": (
+        "Generate a concise summary based on N randomly selected messages from a specified field. Use mode 'map_reduce' to cover large samples (up to 2000 rows). Use page 1, 2, ... to summarize further, non-overlapping samples",
+        SummarizeText,
+    ),
+    "finish": (
+        "Indicate that the task is complete and no further steps are needed",
+        Finish,
+    ),
+}
+
+
+# Seconds before a resource whose background build failed is built in the background again
+BACKGROUND_RETRY_SECONDS = 60.0
+
+# Label enums listed once in the system prompt instead of in every tool schema that uses them
+LABEL_ENUMS = (CategoryClass, IntentClass)
+
+
+# Build the tools schema: compact parameter schemas compiled from the input models
+def build_tools() -> list:
+    from tool_schema import compile_tools
+    return compile_tools(TOOL_DEFINITIONS, LABEL_ENUMS)
+
+
+# Read the OpenAI key from the environment, falling back to Streamlit secrets
+def read_api_key() -> str:
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if api_key:
+        return api_key
+    import streamlit as st
+    return st.secrets["OPENAI_API_KEY"]
+
+
+# Initialize the variable with the data set as a data frame.
+# The CSV is downloaded once into a local Arrow file and memory-mapped afterwards
+# (set DATASET_OFFLINE=1 to forbid network access, DATASET_CACHE_DIR to move the cache,
+# DATASET_URL to use a mirror of the CSV)
 def load_csv_dataset():
-    url = "https://huggingface.co/datasets/bitext/Bitext-customer-support-llm-chatbot-training-dataset/resolve/main/Bitext_Sample_Customer_Support_Training_Dataset_27K_responses-v11.csv"
-    df = pd.read_csv(url)
-    return df
+    from dataset_cache import DATASET_URL, load_cached_dataset
+    return load_cached_dataset(os.environ.get("DATASET_URL", DATASET_URL))
 
-# Load dataset once and reuse
-df_csdataset = load_csv_dataset()
 
-# Initilize OpenAI object
-api_key = st.secrets["OPENAI_API_KEY"]
-client = OpenAI(api_key=api_key)
+def load_dataset_index():
+    from dataset_index import DatasetIndex
+    df, version = load_csv_dataset()
+    return DatasetIndex(df, version=version)
 
-# Define name of LLM model
-model_name = "gpt-4o-mini"
 
-# Initialize the variable with tools schema
-tools = [
-     {
-        "type": "function",
-        "function": {
-            "name": "get_dataset_overview",
-            "description": "Get name of dataset, total number of rows and column names",
-            "parameters": DatasetOverview.model_json_schema()
-        }
-    },
-     {
-        "type": "function",
-        "function": {
-            "name": "select_semantic_intent",
-            "description": "Uses LLM to select the most appropriate intent based on a text description",
-            "parameters": SelectSemanticIntent.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "select_semantic_category",
-            "description": "Uses LLM to select the most appropriate category based on a text description",
-            "parameters": SelectSemanticCategory.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "count_intent",
-            "description": "Count how many records match the selected Intent class",
-            "parameters": CountIntent.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "count_category",
-            "description": "Count how many records match the selected Category class",
-            "parameters": CountCategory.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "sum_values",
-            "description": "Calculate the sum of a list of numeric values",
-            "parameters": SumValues.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "multiplication_float",
-            "description": "Calculate the multiplication of two floats",
-            "parameters": MultiplicationFloat.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "division_float",
-            "description": "Calculate the division of two floats",
-            "parameters": DivisionFloat.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "show_examples",
-            "description": "Display N random examples from the dataset with optionally filtered field",
-            "parameters": ShowExamples.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "summarize_text",
-            "description": "Generate a concise summary based on N randomly selected messages from a specified field",
-            "parameters": SummarizeText.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "finish",
-            "description": "Indicate that the task is complete and no further steps are needed",
-            "parameters": Finish.model_json_schema()
+# Scheduler admitting every LLM request of the process (LLM_MAX_IN_FLIGHT, LLM_RPM and LLM_TPM override the limits)
+def build_llm_scheduler():
+    from llm_client import MAX_IN_FLIGHT, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, RequestScheduler
+    return RequestScheduler(
+        max_in_flight=int(os.environ.get("LLM_MAX_IN_FLIGHT", MAX_IN_FLIGHT)),
+        requests_per_minute=float(os.environ.get("LLM_RPM", REQUESTS_PER_MINUTE)),
+        tokens_per_minute=float(os.environ.get("LLM_TPM", TOKENS_PER_MINUTE)),
+    )
+
+
+# The OpenAI clients keep their own pooled HTTP connections and leave retries to the scheduler-aware wrapper
+def build_client():
+    from openai import OpenAI
+    from llm_client import PooledClient
+    client = OpenAI(api_key=read_api_key(), max_retries=0)
+    return PooledClient(client, runtime.llm_scheduler)
+
+
+def build_async_client():
+    from openai import AsyncOpenAI
+    from llm_client import AsyncPooledClient
+    client = AsyncOpenAI(api_key=read_api_key(), max_retries=0)
+    return AsyncPooledClient(client, runtime.llm_scheduler)
+
+
+def build_classification_cache():
+    from llm_cache import DEFAULT_CACHE_PATH, LLMCache
+    return LLMCache(os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH), table="classification")
+
+
+def build_summary_cache():
+    from llm_cache import DEFAULT_CACHE_PATH, LLMCache
+    return LLMCache(os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH), table="summary",
+                    max_memory_items=256, max_disk_items=10_000, ttl_seconds=7 * 24 * 3600)
+
+
+def build_result_store():
+    from observations import ResultStore
+    return ResultStore()
+
+
+# Conversations of the app by session id (SESSION_STORE_PATH moves the SQLite file)
+def build_session_store():
+    from session_store import DEFAULT_SESSION_PATH, SessionStore
+    return SessionStore(os.environ.get("SESSION_STORE_PATH", DEFAULT_SESSION_PATH))
+
+
+def build_answer_cache():
+    from fast_path import AnswerCache
+    from llm_cache import DEFAULT_CACHE_PATH, LLMCache
+    return AnswerCache(LLMCache(os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH), table="answers",
+                                max_memory_items=512, max_disk_items=10_000, ttl_seconds=24 * 3600))
+
+
+# Data backend the tools query: the in-memory frame (DATASET_BACKEND=pandas, default)
+# or Parquet files streamed with pyarrow.dataset (DATASET_BACKEND=arrow, DATASET_PARQUET=file, directory or glob)
+def build_backend():
+    from data_backend import ArrowDatasetBackend, PandasBackend
+    kind = os.environ.get("DATASET_BACKEND", "pandas")
+    if kind == "arrow":
+        import glob
+        source = os.environ["DATASET_PARQUET"]
+        return ArrowDatasetBackend(sorted(glob.glob(source)) if glob.has_magic(source) else source)
+    if kind != "pandas":
+        raise ValueError(f"Unknown DATASET_BACKEND: {kind}")
+    return PandasBackend(runtime.dataset_index, lambda: runtime.search_index)
+
+
+def build_classifiers():
+    from local_classifier import train_classifiers
+    return train_classifiers(runtime.backend.training_frame())
+
+
+def build_search_index():
+    from dataset_cache import dataset_cache_dir
+    from search_index import load_search_index
+    return load_search_index(runtime.dataset_index, dataset_cache_dir())
+
+
+def build_event_loop():
+    from background_loop import BackgroundLoop
+    return BackgroundLoop()
+
+
+class RuntimeContext:
+    """Resources shared by the tools and the agent, each built on first use.
+
+    Nothing is loaded at import time. Any resource can be injected up front,
+    e.g. `runtime.configure(client=stub_client)` in benchmarks or tests, and
+    new lazily built resources can be added with `register`.
+    """
+
+    def __init__(self, **resources):
+        self._factories = {
+            "dataset_index": load_dataset_index,
+            "backend": build_backend,
+            "llm_scheduler": build_llm_scheduler,
+            "client": build_client,
+            "async_client": build_async_client,
+            "event_loop": build_event_loop,
+            "classification_cache": build_classification_cache,
+            "classifiers": build_classifiers,
+            "summary_cache": build_summary_cache,
+            "answer_cache": build_answer_cache,
+            "result_store": build_result_store,
+            "session_store": build_session_store,
+            "search_index": build_search_index,
+            "tools": build_tools,
         }
-    }
-]
+        self._resources = {}
+        self._loop_clients = weakref.WeakKeyDictionary()
+        self._locks = {}
+        self._failures = {}  # name -> (time.monotonic(), exception) of the last failed background build
+        self._guard = threading.Lock()
+        self.model_name = os.environ.get("OPENAI_MODEL", model_name)
+        self.configure(**resources)
+
+    def register(self, name: str, factory) -> None:
+        """Add a lazily built resource."""
+        with self._guard:
+            self._factories[name] = factory
+            self._resources.pop(name, None)
+            self._failures.pop(name, None)
+
+    def configure(self, model_name: str = None, **resources) -> None:
+        """Inject ready-made resources instead of building them."""
+        if model_name:
+            self.model_name = model_name
+        with self._guard:
+            for name, value in resources.items():
+                if name not in self._factories:
+                    raise KeyError(f"Unknown runtime resource: {name}")
+                self._resources[name] = value
+
+    def reset(self, *names: str) -> None:
+        """Drop built resources so they are rebuilt on next access."""
+        with self._guard:
+            for name in names or list(self._resources):
+                self._resources.pop(name, None)
+            for name in names or list(self._failures):
+                self._failures.pop(name, None)
+            if not names or "async_client" in names:
+                self._loop_clients.clear()
+
+    def get(self, name: str, wait: bool = True):
+        """Return a resource, building it once under a per-resource lock.
+
+        With `wait=False`, a resource that is not built yet is built in the
+        background (unless another thread, e.g. the warm-up, is already
+        building it) and None is returned right away. After a failed
+        background build, the next one starts BACKGROUND_RETRY_SECONDS later.
+        """
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        if not wait:
+            failure = self._failures.get(name)
+            retry = failure is None or time.monotonic() - failure[0] >= BACKGROUND_RETRY_SECONDS
+            if retry and not lock.locked():
+                threading.Thread(target=self._build_in_background, args=(name,), name=f"build-{name}",
+                                 daemon=True).start()
+            return None
+        with lock:
+            if name not in self._resources:
+                self._resources[name] = self._factories[name]()
+            return self._resources[name]
+
+    def _build_in_background(self, name: str) -> None:
+        try:
+            self.get(name)
+        except Exception as e:
+            self._failures[name] = (time.monotonic(), e)
+        else:
+            self._failures.pop(name, None)
+
+    @property
+    def dataset_index(self):
+        return self.get("dataset_index")
+
+    @property
+    def backend(self):
+        return self.get("backend")
+
+    @property
+    def df(self):
+        return self.dataset_index.df
+
+    @property
+    def llm_scheduler(self):
+        return self.get("llm_scheduler")
+
+    @property
+    def client(self):
+        return self.get("client")
+
+    @property
+    def async_client(self):
+        """Async client bound to the running event loop (one pooled client per loop, one shared scheduler)."""
+        if "async_client" in self._resources:
+            return self._resources["async_client"]
+        loop = asyncio.get_running_loop()
+        client = self._loop_clients.get(loop)
+        if client is not None:
+            return client
+        # Built outside the guard: the factory reads other resources (the scheduler) through get()
+        client = self._factories["async_client"]()
+        with self._guard:
+            return self._loop_clients.setdefault(loop, client)
+
+    @property
+    def event_loop(self):
+        return self.get("event_loop")
+
+    @property
+    def classification_cache(self):
+        return self.get("classification_cache")
+
+    @property
+    def classifiers(self) -> dict:
+        return self.get("classifiers")
+
+    @property
+    def summary_cache(self):
+        return self.get("summary_cache")
+
+    @property
+    def answer_cache(self):
+        return self.get("answer_cache")
+
+    @property
+    def result_store(self):
+        return self.get("result_store")
+
+    @property
+    def session_store(self):
+        return self.get("session_store")
+
+    @property
+    def search_index(self):
+        return self.get("search_index")
+
+    @property
+    def tools(self) -> list:
+        return self.get("tools")
+
+
+# Global runtime context shared by every session in the process
+runtime = RuntimeContext()
+
+
+# Lazy access to the former module-level globals (config.client, config.tools, ...)
+def __getattr__(name: str):
+    if name == "df_csdataset":
+        return runtime.df
+    if name in ("dataset_index", "client", "tools"):
+        return getattr(runtime, name)
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
 
 
 # Initilize the global variable with system prompt
@@ -139,7 +400,9 @@ Use the following reasoning process:
 
 Important rules:
 - You have access to a fixed set of tools. Always select the most relevant one based on the user query.
+- For distributions, frequencies, rankings or top-k questions use value_distribution (or intent_category_crosstab) in a single call instead of counting classes one by one.
 - If a tool returns no relevant data or cannot answer the query, try a different tool—but do not repeat calls with the same parameters.
 – If the query is unrelated to the dataset or no relevant information exists in the data, say so clearly and politely.
 – Do not attempt to answer based on general knowledge or assumptions.
-"""
\ No newline at end of file
+
+""" + label_prompt(LABEL_ENUMS)
\ No newline at end of file
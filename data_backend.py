@@ -0,0 +1,253 @@
+"""Data backends the tools query the dataset through.
+
+`PandasBackend` serves the in-memory frame through `DatasetIndex` and the
+inverted search index. `ArrowDatasetBackend` streams over Parquet files
+with pyarrow.dataset: counts come from one aggregate pass at open, while
+filters, sampling and text search are evaluated batch by batch with
+projection and predicate pushdown, so memory stays bounded by the batch
+size and the number of rows requested, not by the dataset size.
+"""
+import hashlib
+import json
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from dataset_index import GROUP_FIELDS, PERMUTATION_SEED, GroupCounts, _by_frequency
+from search_index import parse_query, phrase_pattern
+
+# Rows per scanned batch of the Arrow backend
+BATCH_SIZE = 65_536
+# Rows used to train the local classifiers on large datasets
+TRAINING_MAX_ROWS = 200_000
+
+
+class DataBackend:
+    """Queries the tools run against the dataset.
+
+    Implementations provide `version`, `len()`, the `GroupCounts` queries
+    (`count`, `group_size`, `distribution`, `unique_count`, `crosstab_counts`)
+    and the row-level `sample`, `search` and `training_frame` below.
+    """
+    version = None
+
+    def crosstab_counts(self) -> dict:
+        """category -> (intent, count) pairs, most frequent first."""
+        return self.group_value_counts["intent"]
+
+    def sample(self, k: int, offset: int = 0, field: str = None, value: str = None,
+               columns: list = None, seed: int = PERMUTATION_SEED) -> pd.DataFrame:
+        """Rows `offset`..`offset + k` of a fixed random order of a group (or all rows).
+
+        The order depends only on `seed`, so consecutive pages never repeat rows.
+        """
+        raise NotImplementedError
+
+    def search(self, query: str, field: str, condition_field: str = None, condition_value: str = None,
+               number_rows: int = 3) -> dict:
+        """Rows whose `field` text matches `query` (see search_index.parse_query), optionally within a group.
+
+        Returns the number of matches, the number of rows searched, the most
+        frequent intents among the matches and the first `number_rows` of them.
+        """
+        raise NotImplementedError
+
+    def training_frame(self, max_rows: int = TRAINING_MAX_ROWS) -> pd.DataFrame:
+        """instruction/intent/category rows for training the local classifiers."""
+        raise NotImplementedError
+
+
+class PandasBackend(DataBackend):
+    """The dataset held in memory as one DataFrame."""
+
+    def __init__(self, dataset_index, search_index=None):
+        self.dataset_index = dataset_index
+        self.version = dataset_index.version
+        self._search_index = search_index
+
+    def __len__(self) -> int:
+        return len(self.dataset_index)
+
+    def __getattr__(self, name: str):
+        # count, group_size, distribution, unique_count, group_value_counts, ...
+        return getattr(self.dataset_index, name)
+
+    def sample(self, k: int, offset: int = 0, field: str = None, value: str = None,
+               columns: list = None, seed: int = PERMUTATION_SEED) -> pd.DataFrame:
+        dataset_index = self.dataset_index
+        if seed == PERMUTATION_SEED:
+            rows = dataset_index.sample_positions(k, offset, field, value)
+        else:
+            rows = dataset_index.group_positions(field, value) if field else np.arange(len(dataset_index))
+            rows = np.random.default_rng(seed).permutation(rows)[offset:offset + k]
+        df = dataset_index.df
+        if columns is None:
+            return df.iloc[rows]
+        return df.iloc[rows, [df.columns.get_loc(c) for c in columns]]
+
+    def search(self, query: str, field: str, condition_field: str = None, condition_value: str = None,
+               number_rows: int = 3) -> dict:
+        dataset_index = self.dataset_index
+        within = dataset_index.group_positions(condition_field, condition_value) if condition_field else None
+        search_index = self._search_index() if callable(self._search_index) else self._search_index
+        rows = search_index.search(query, field, within)
+        examples = dataset_index.df.iloc[rows[:number_rows]][[field, "intent"]]
+        return {
+            "matches": len(rows),
+            "scope": len(within) if within is not None else len(dataset_index),
+            "top_intents": dataset_index.label_counts("intent", rows)[:5],
+            "examples": examples.to_dict(orient="records"),
+        }
+
+    def training_frame(self, max_rows: int = TRAINING_MAX_ROWS) -> pd.DataFrame:
+        df = self.dataset_index.df
+        if len(df) <= max_rows:
+            return df
+        return self.sample(max_rows, columns=["instruction", *GROUP_FIELDS])
+
+
+def _row_keys(rows: np.ndarray, seed: int) -> np.ndarray:
+    """Pseudo-random sort keys of row numbers (splitmix64), fixed for a seed."""
+    with np.errstate(over="ignore"):
+        z = rows.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _query_mask(texts, clauses: list, has_scope: bool):
+    """Boolean Arrow mask of the texts matching the parsed query clauses; only negative terms start from all texts."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not clauses and not has_scope:
+        return pa.array(np.zeros(len(texts), dtype=bool))
+    mask = pa.array(np.ones(len(texts), dtype=bool))
+    for negated, alternatives in clauses:
+        matched = None
+        for tokens in alternatives:
+            hit = pc.match_substring_regex(texts, phrase_pattern(tokens), ignore_case=True)
+            matched = hit if matched is None else pc.or_(matched, hit)
+        matched = pc.fill_null(matched, False)
+        mask = pc.and_(mask, pc.invert(matched) if negated else matched)
+    return mask
+
+
+class ArrowDatasetBackend(GroupCounts, DataBackend):
+    """Parquet files (a file, a directory or a list of files) scanned with pyarrow.dataset."""
+
+    def __init__(self, source, batch_size: int = BATCH_SIZE):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        self.dataset = ds.dataset(source, format="parquet")
+        self.batch_size = batch_size
+        self.fragments = list(self.dataset.get_fragments())
+        self.fragment_offsets = np.cumsum([0] + [fragment.count_rows() for fragment in self.fragments])
+        self.rows = int(self.fragment_offsets[-1])
+        self.version = self._files_version()
+
+        # One aggregate pass over the two label columns gives every count the tools need
+        pairs = Counter()
+        for batch in self.dataset.to_batches(columns=list(GROUP_FIELDS), batch_size=batch_size):
+            grouped = pa.Table.from_batches([batch]).group_by(list(GROUP_FIELDS)).aggregate([([], "count_all")])
+            pairs.update(dict(zip(zip(grouped["intent"].to_pylist(), grouped["category"].to_pylist()),
+                                  grouped["count_all"].to_pylist())))
+        crosstab = pd.Series(pairs, dtype="int64")
+        crosstab = crosstab[[intent is not None and category is not None for intent, category in crosstab.index]]
+        self._init_counts(crosstab.unstack(fill_value=0) if len(crosstab) else pd.DataFrame(dtype="int64"))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _files_version(self) -> str:
+        """Hash of the file paths, sizes and modification times."""
+        infos = self.dataset.filesystem.get_file_info(sorted(self.dataset.files))
+        listing = [(info.path, info.size, info.mtime_ns) for info in infos]
+        return hashlib.sha256(json.dumps(listing).encode()).hexdigest()
+
+    def _fragment_batches(self, columns: list, filter=None):
+        """(first row number, batch) over all fragments in file order."""
+        for fragment, start in zip(self.fragments, self.fragment_offsets):
+            if filter is None:
+                row = int(start)
+                for batch in fragment.to_batches(columns=columns, batch_size=self.batch_size):
+                    yield row, batch
+                    row += batch.num_rows
+            else:
+                for batch in fragment.to_batches(columns=columns, filter=filter, batch_size=self.batch_size):
+                    yield None, batch
+
+    def _first_rows(self, limit: int, field: str, value: str, seed: int) -> np.ndarray:
+        """Row numbers of the group with the `limit` smallest keys, in key order; keeps at most 2 * limit in memory."""
+        import pyarrow.compute as pc
+
+        best_rows, best_keys = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+
+        def keep(rows):
+            nonlocal best_rows, best_keys
+            best_rows = np.concatenate([best_rows, rows])
+            best_keys = np.concatenate([best_keys, _row_keys(rows, seed)])
+            if len(best_rows) > limit:
+                top = np.argpartition(best_keys, limit - 1)[:limit]
+                best_rows, best_keys = best_rows[top], best_keys[top]
+
+        if field is None:
+            for start in range(0, self.rows, self.batch_size):
+                keep(np.arange(start, min(self.rows, start + self.batch_size), dtype=np.int64))
+        else:
+            for start, batch in self._fragment_batches([field]):
+                mask = pc.fill_null(pc.equal(batch.column(0), value), False).to_numpy(zero_copy_only=False)
+                keep(start + np.flatnonzero(mask))
+        return best_rows[np.argsort(best_keys, kind="stable")]
+
+    def _take(self, rows: np.ndarray, columns: list = None) -> pd.DataFrame:
+        """Rows by global row number, in the given order."""
+        import pyarrow as pa
+
+        fragment_ids = np.searchsorted(self.fragment_offsets, rows, side="right") - 1
+        order = np.argsort(fragment_ids, kind="stable")
+        tables = []
+        for fragment_id in np.unique(fragment_ids):
+            local = rows[fragment_ids == fragment_id] - self.fragment_offsets[fragment_id]
+            tables.append(self.fragments[fragment_id].take(pa.array(local), columns=columns))
+        if not tables:
+            return self.dataset.schema.empty_table().select(columns or self.dataset.schema.names).to_pandas()
+        df = pa.concat_tables(tables).to_pandas()
+        df.index = order  # taken grouped by fragment; restore the requested order
+        return df.sort_index().reset_index(drop=True)
+
+    def sample(self, k: int, offset: int = 0, field: str = None, value: str = None,
+               columns: list = None, seed: int = PERMUTATION_SEED) -> pd.DataFrame:
+        if k <= 0 or offset >= self.group_size(field, value):
+            return self._take(np.empty(0, dtype=np.int64), columns)
+        rows = self._first_rows(offset + k, field, value, seed)[offset:]
+        return self._take(rows, columns)
+
+    def search(self, query: str, field: str, condition_field: str = None, condition_value: str = None,
+               number_rows: int = 3) -> dict:
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        clauses = parse_query(query)
+        filter = ds.field(condition_field) == condition_value if condition_field else None
+        matches, intents, examples = 0, Counter(), []
+        for _, batch in self._fragment_batches([field, "intent"], filter):
+            matched = batch.filter(_query_mask(batch.column(0), clauses, filter is not None))
+            if matched.num_rows == 0:
+                continue
+            matches += matched.num_rows
+            counts = pc.value_counts(matched.column(1))
+            intents.update(dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())))
+            if len(examples) < number_rows:
+                examples.extend(matched.slice(0, number_rows - len(examples)).to_pylist())
+        return {
+            "matches": matches,
+            "scope": self.group_size(condition_field, condition_value),
+            "top_intents": _by_frequency(intents.items())[:5],
+            "examples": examples,
+        }
+
+    def training_frame(self, max_rows: int = TRAINING_MAX_ROWS) -> pd.DataFrame:
+        return self.sample(max_rows, columns=["instruction", *GROUP_FIELDS])
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import json
+import os
+import urllib.request
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Location of the public dataset and of the local columnar copy
+DATASET_URL = "https://huggingface.co/datasets/bitext/Bitext-customer-support-llm-chatbot-training-dataset/resolve/main/Bitext_Sample_Customer_Support_Training_Dataset_27K_responses-v11.csv"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dataset_cache")
+MANIFEST_NAME = "manifest.json"
+
+
+def dataset_cache_dir() -> str:
+    """Directory of the local dataset cache (DATASET_CACHE_DIR or the default)."""
+    return os.environ.get("DATASET_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes")
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _read_manifest(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path: str, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def _map_arrow_file(path: str) -> pd.DataFrame:
+    """Memory-map an uncompressed Arrow file; text columns stay backed by the mapped pages."""
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _valid_cache_entry(cache_dir: str, manifest: dict, verify: bool) -> bool:
+    arrow_file = manifest.get("arrow_file")
+    if not arrow_file:
+        return False
+    path = os.path.join(cache_dir, arrow_file)
+    if not os.path.exists(path):
+        return False
+    return not verify or _file_sha256(path) == manifest.get("arrow_sha256")
+
+
+def _build_cache(url: str, cache_dir: str) -> dict:
+    """Download the CSV once, convert it to an Arrow file and record its hashes."""
+    with urllib.request.urlopen(url) as response:
+        raw = response.read()
+    source_sha256 = hashlib.sha256(raw).hexdigest()
+
+    df = pd.read_csv(io.BytesIO(raw))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    arrow_file = f"dataset-{source_sha256[:16]}.arrow"
+    arrow_path = os.path.join(cache_dir, arrow_file)
+    _write_atomic(arrow_path, lambda p: feather.write_feather(table, p, compression="uncompressed"))
+
+    manifest = {
+        "source_url": url,
+        "source_sha256": source_sha256,
+        "arrow_file": arrow_file,
+        "arrow_sha256": _file_sha256(arrow_path),
+        "number_rows": table.num_rows,
+    }
+    _write_atomic(os.path.join(cache_dir, MANIFEST_NAME), lambda p: _write_json(p, manifest))
+    return manifest
+
+
+def load_cached_dataset(url: str = DATASET_URL, cache_dir: str = None,
+                        offline: bool = None, verify: bool = True) -> tuple[pd.DataFrame, str]:
+    """Load the dataset from the local Arrow cache, building it on first use.
+
+    Returns the data frame and the dataset version (sha256 of the source CSV).
+    In offline mode (argument or DATASET_OFFLINE=1) the network is never used
+    and a missing or corrupted cache raises FileNotFoundError.
+    """
+    cache_dir = cache_dir or dataset_cache_dir()
+    offline = _env_flag("DATASET_OFFLINE") if offline is None else offline
+
+    manifest = _read_manifest(cache_dir)
+    if manifest.get("source_url") != url or not _valid_cache_entry(cache_dir, manifest, verify):
+        if offline:
+            raise FileNotFoundError(f"No valid dataset cache in '{cache_dir}' and offline mode is enabled")
+        manifest = _build_cache(url, cache_dir)
+
+    df = _map_arrow_file(os.path.join(cache_dir, manifest["arrow_file"]))
+    return df, manifest["source_sha256"]
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# Columns with a small fixed set of labels that the tools filter on
+GROUP_FIELDS = ("intent", "category")
+# Seed of the shuffled row orders used for sampling examples
+PERMUTATION_SEED = 42
+
+
+def _by_frequency(pairs) -> list:
+    """Non-zero (label, count) pairs, most frequent first."""
+    pairs = [(str(label), int(n)) for label, n in pairs if n]
+    return sorted(pairs, key=lambda item: (-item[1], item[0]))
+
+
+class GroupCounts:
+    """Row counts per intent, per category and per (intent, category) pair.
+
+    Built from the intent x category crosstab; label counts are kept sorted
+    by frequency, overall and within each group of the other field.
+    """
+
+    def __init__(self, crosstab: pd.DataFrame):
+        self._init_counts(crosstab)
+
+    def _init_counts(self, crosstab: pd.DataFrame) -> None:
+        self.crosstab = crosstab
+        self.counts = {
+            "intent": {str(label): int(n) for label, n in crosstab.sum(axis=1).items()},
+            "category": {str(label): int(n) for label, n in crosstab.sum(axis=0).items()},
+        }
+        self.value_counts = {field: _by_frequency(self.counts[field].items()) for field in GROUP_FIELDS}
+        self.group_value_counts = {
+            "intent": {str(c): _by_frequency(crosstab[c].items()) for c in crosstab.columns},
+            "category": {str(i): _by_frequency(crosstab.loc[i].items()) for i in crosstab.index},
+        }
+
+    def __len__(self) -> int:
+        return int(self.crosstab.to_numpy().sum())
+
+    def count(self, field: str, value: str) -> int:
+        """Number of rows where `field` equals `value`."""
+        return self.counts[field].get(value, 0)
+
+    def group_size(self, field: str = None, value: str = None) -> int:
+        return len(self) if field is None else self.count(field, value)
+
+    def distribution(self, field: str, condition_field: str = None, condition_value: str = None) -> list:
+        """(label, count) pairs of `field`, most frequent first, optionally within one group of the other field."""
+        if condition_field is None:
+            return self.value_counts[field]
+        if condition_field == field:
+            return [(condition_value, self.count(field, condition_value))]
+        return self.group_value_counts[field].get(condition_value, [])
+
+    def unique_count(self, field: str) -> int:
+        """Number of distinct non-empty labels in `field`."""
+        return sum(1 for n in self.counts[field].values() if n)
+
+
+class DatasetIndex(GroupCounts):
+    """Group index over the dataset built once at load time.
+
+    Stores `intent` and `category` as categorical columns, the row positions
+    of every label and the precomputed counts, so the tools can count and
+    slice groups without scanning and copying the full frame on each call.
+    Every group also has a fixed shuffled order of its rows, so random
+    samples are taken page by page as slices of it.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: str = None):
+        self.version = version
+        df = df.reset_index(drop=True)
+        for field in GROUP_FIELDS:
+            df[field] = df[field].astype("category")
+        self.df = df
+
+        self.positions = {}
+        self.codes = {}
+        self.labels = {}
+        self.shuffled = np.random.default_rng(PERMUTATION_SEED).permutation(len(df))
+        self.shuffled_positions = {}
+        for field in GROUP_FIELDS:
+            codes = df[field].cat.codes.to_numpy()
+            self.codes[field] = codes
+            self.labels[field] = [str(label) for label in df[field].cat.categories]
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(df[field].cat.categories) + 1))
+            self.positions[field] = {
+                str(label): order[bounds[i]:bounds[i + 1]]
+                for i, label in enumerate(df[field].cat.categories)
+            }
+
+            # Rows of each group in the order of the global shuffle
+            shuffled = self.shuffled[np.argsort(codes[self.shuffled], kind="stable")]
+            self.shuffled_positions[field] = {
+                str(label): shuffled[bounds[i]:bounds[i + 1]]
+                for i, label in enumerate(df[field].cat.categories)
+            }
+
+        self._init_counts(pd.crosstab(df["intent"], df["category"]))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def group_positions(self, field: str, value: str) -> np.ndarray:
+        """Row positions where `field` equals `value`."""
+        return self.positions[field].get(value, np.empty(0, dtype=np.intp))
+
+    def group(self, field: str, value: str, columns: list = None) -> pd.DataFrame:
+        """Rows of one group, selected by position instead of a boolean mask."""
+        rows = self.group_positions(field, value)
+        if columns is None:
+            return self.df.iloc[rows]
+        return self.df.iloc[rows, [self.df.columns.get_loc(c) for c in columns]]
+
+    def sample_positions(self, k: int, offset: int = 0, field: str = None, value: str = None) -> np.ndarray:
+        """Up to `k` random row positions starting at `offset` in the shuffled order of a group (or all rows).
+
+        Consecutive offsets never repeat rows, so pages of a sample are disjoint.
+        """
+        if field is None:
+            shuffled = self.shuffled
+        else:
+            shuffled = self.shuffled_positions[field].get(value, np.empty(0, dtype=np.intp))
+        return shuffled[offset:offset + k]
+
+    def label_counts(self, field: str, rows: np.ndarray) -> list:
+        """(label, count) pairs of `field` over the given row positions, most frequent first."""
+        codes = self.codes[field][rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.labels[field]))
+        return _by_frequency(zip(self.labels[field], counts))
@@ -0,0 +1,123 @@
+"""Answers served before the agent loop runs.
+
+Recognized question templates ("What categories exist?", "What is the intent
+distribution?", ...) are answered straight from the precomputed dataset
+counts. Other final answers are cached under the normalized question, the
+model and the dataset version, and reused only for the same normalized
+question: near-identical phrasings can mean the opposite ("... not
+complaint?"), so similarity is never enough. Follow-ups that depend on the
+conversation ("and for those?", "show more") always go to the agent.
+"""
+import re
+from typing import Optional
+
+from config import runtime
+from llm_cache import make_key, normalize_query
+
+# Rows shown by "most frequent" answers without an explicit "top N"
+DEFAULT_TOP_K = 5
+
+# Words that point back at earlier turns
+_FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "there", "same",
+    "previous", "above", "more", "another", "other", "others", "again", "also", "else",
+}
+_FOLLOW_UP_OPENERS = ("and ", "but ", "what about ", "how about ", "then ", "so ")
+
+_FIELD = r"(?P<field>categor(?:y|ies)|intents?)"
+_TOP = r"(?:most (?:frequent|common|popular)|top(?: (?P<k>\d+))?|largest|biggest)"
+_TEMPLATES = [
+    ("labels", rf"(?:what|which) {_FIELD} (?:exist|are there|are available|do (?:we|you) have)(?: in the dataset)?"),
+    ("labels", rf"(?:list|show)(?: me)?(?: all)?(?: the)? {_FIELD}"),
+    ("top", rf"(?:what|which) are(?: the)? {_TOP} {_FIELD}"),
+    ("top", rf"(?:show(?: me)?(?: the)? )?{_TOP} {_FIELD}"),
+    ("distribution", rf"(?:what is |show(?: me)? )?(?:the )?{_FIELD} distribution"),
+    ("distribution", rf"(?:what is |show(?: me)? )?(?:the )?distribution of(?: the)? {_FIELD}"),
+    ("unique", rf"how many (?:different |distinct )?{_FIELD} (?:are there|exist|does the dataset have)"),
+    ("rows", r"how many (?:rows|records|examples|instructions) (?:are there|does the dataset have|are in the dataset)"),
+]
+_TEMPLATES = [(name, re.compile(pattern)) for name, pattern in _TEMPLATES]
+
+
+def is_follow_up(messages: list) -> bool:
+    """Whether the last user message only makes sense with the earlier turns."""
+    user_turns = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+    if len(user_turns) < 2:
+        return False
+    question = normalize_query(user_turns[-1])
+    words = question.split()
+    return len(words) < 3 or question.startswith(_FOLLOW_UP_OPENERS) or not _FOLLOW_UP_WORDS.isdisjoint(words)
+
+
+def _field(match: re.Match) -> str:
+    return "category" if match.group("field").startswith("categor") else "intent"
+
+
+def _lines(pairs: list, total: int) -> str:
+    return "\n".join(f"- {label}: {n:,} ({n / total:.1%})" for label, n in pairs)
+
+
+def template_answer(question: str, backend) -> Optional[str]:
+    """Answer to a recognized question template from the dataset counts, or None."""
+    question = normalize_query(question)
+    for name, pattern in _TEMPLATES:
+        match = pattern.fullmatch(question)
+        if match:
+            break
+    else:
+        return None
+
+    total = len(backend)
+    if name == "rows":
+        return f"The dataset has {total:,} rows."
+    field = _field(match)
+    plural = "categories" if field == "category" else "intents"
+    pairs = backend.distribution(field)
+    if name == "unique":
+        return f"The dataset has {len(pairs)} {plural}."
+    if name == "labels":
+        return f"The dataset has {len(pairs)} {plural} ({total:,} rows):\n" + _lines(pairs, total)
+    if name == "top":
+        k = int(match.group("k") or DEFAULT_TOP_K)
+        return f"The {min(k, len(pairs))} most frequent {plural} of {len(pairs)}:\n" + _lines(pairs[:k], total)
+    return f"{field.capitalize()} distribution over {total:,} rows ({len(pairs)} {plural}):\n" + _lines(pairs, total)
+
+
+class AnswerCache:
+    """Final answers by normalized question within a scope (model, dataset version), stored in an `LLMCache`."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    @staticmethod
+    def _key(question: str, scope: tuple) -> str:
+        return make_key(normalize_query(question), *scope)
+
+    def get(self, question: str, scope: tuple) -> Optional[str]:
+        return self.cache.get(self._key(question, scope))
+
+    def set(self, question: str, scope: tuple, answer: str) -> None:
+        self.cache.set(self._key(question, scope), answer)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def _scope() -> tuple:
+    return runtime.model_name, runtime.backend.version
+
+
+def fast_answer(question: str, use_cache: bool = True) -> Optional[tuple]:
+    """("template" or "cache", answer) for a question answerable without the agent, else None."""
+    answer = template_answer(question, runtime.backend)
+    if answer is not None:
+        return "template", answer
+    if use_cache:
+        answer = runtime.answer_cache.get(question, _scope())
+        if answer is not None:
+            return "cache", answer
+    return None
+
+
+def cache_answer(question: str, answer: str) -> None:
+    runtime.answer_cache.set(question, _scope(), answer)
@@ -0,0 +1,77 @@
+import json
+
+# Prompt budget for the conversation sent to the model and the part kept verbatim
+HISTORY_TOKEN_BUDGET = 6000
+KEEP_RECENT_TURNS = 2
+DIGEST_MAX_CHARS = 300
+DIGEST_TEXT_CHARS = 80
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: dict) -> int:
+    """Approximate prompt tokens of one chat message, including tool call arguments."""
+    tokens = 4 + approx_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += approx_tokens(function.get("name", "")) + approx_tokens(function.get("arguments", ""))
+    return tokens
+
+
+def _digest_value(value):
+    if isinstance(value, str):
+        return value if len(value) <= DIGEST_TEXT_CHARS else value[:DIGEST_TEXT_CHARS] + "…"
+    if isinstance(value, list):
+        return f"<{len(value)} items>"
+    if isinstance(value, dict):
+        return {key: _digest_value(item) for key, item in value.items()}
+    return value
+
+
+def digest_observation(content: str, max_chars: int = DIGEST_MAX_CHARS) -> str:
+    """Compact form of a tool observation: scalars kept, long texts cut, lists replaced by their size."""
+    if len(content) <= max_chars:
+        return content
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return "[compacted] " + content[:max_chars] + "…"
+    digest = json.dumps(_digest_value(data), ensure_ascii=False)
+    if len(digest) > max_chars:
+        digest = digest[:max_chars] + "…"
+    return "[compacted] " + digest
+
+
+def compact_history(messages: list, token_budget: int = HISTORY_TOKEN_BUDGET,
+                    keep_recent_turns: int = KEEP_RECENT_TURNS) -> list:
+    """View of the conversation that fits the token budget, for sending to the model.
+
+    System messages and the last `keep_recent_turns` user turns stay verbatim.
+    When the history exceeds `token_budget`, tool observations of older turns
+    are replaced by digests, oldest first, until it fits. `messages` itself is
+    never modified, so the full history stays available for display.
+    """
+    tokens = [message_tokens(message) for message in messages]
+    total = sum(tokens)
+    if total <= token_budget:
+        return messages
+
+    user_positions = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+    if len(user_positions) <= keep_recent_turns:
+        return messages
+    recent_start = user_positions[-keep_recent_turns] if keep_recent_turns else len(messages)
+
+    compacted = list(messages)
+    for i in range(recent_start):
+        if total <= token_budget:
+            break
+        message = messages[i]
+        if message.get("role") != "tool":
+            continue
+        digest = digest_observation(message.get("content") or "")
+        compacted[i] = {**message, "content": digest}
+        total -= tokens[i] - message_tokens(compacted[i])
+    return compacted
@@ -0,0 +1,300 @@
+"""Shared access to the chat completions API for every session in the process.
+
+All requests pass one `RequestScheduler`: it caps in-flight requests,
+enforces token buckets on requests and tokens per minute, and hands free
+slots to sessions in round-robin order, so one bursty session cannot starve
+the others. `PooledClient` / `AsyncPooledClient` wrap the OpenAI clients,
+take a slot before every call and retry 429/5xx/connection errors with
+jittered exponential backoff, never past the request deadline.
+"""
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Optional
+
+from history import approx_tokens
+from tracing import metrics
+
+MAX_IN_FLIGHT = 16
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+REQUEST_DEADLINE_SECONDS = 60.0
+# Completion size assumed when reserving tokens for a request without max_tokens
+COMPLETION_TOKENS_ESTIMATE = 512
+
+# Session the current request is queued under (set once per agent run)
+current_session = contextvars.ContextVar("llm_session", default="default")
+# Absolute time.monotonic() deadline for requests made in the current context
+current_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to `capacity`; not thread-safe on its own."""
+
+    def __init__(self, rate_per_minute: Optional[float], capacity: float = None):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = capacity or (rate_per_minute or 0)
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 when they are)."""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate is not None:
+            self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        if self.rate is not None:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    __slots__ = ("session", "tokens", "deadline", "future", "queued")
+
+    def __init__(self, session: str, tokens: int, deadline: Optional[float]):
+        self.session = session
+        self.tokens = tokens
+        self.deadline = deadline
+        self.future = Future()
+        self.queued = time.monotonic()
+
+
+class RequestScheduler:
+    """Admission control for LLM requests shared by threads and event loops.
+
+    `acquire` / `aacquire` block until a slot is granted and return a ticket
+    that must be passed to `release` with the tokens actually used.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE):
+        self.max_in_flight = max_in_flight
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._queues = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _submit(self, session: str, tokens: int, deadline: Optional[float]) -> _Ticket:
+        ticket = _Ticket(session, tokens, deadline)
+        with self._lock:
+            self._queues.setdefault(session, deque()).append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _next_ticket(self, now: float, expired: list) -> Optional[_Ticket]:
+        """Head ticket of the next session in round-robin order, dropping cancelled and expired ones."""
+        while self._queues:
+            session, queue = next(iter(self._queues.items()))
+            ticket = queue[0]
+            if ticket.future.cancelled():
+                pass
+            elif ticket.deadline is not None and now >= ticket.deadline:
+                expired.append(ticket)
+            else:
+                return ticket
+            self._pop(session)
+        return None
+
+    def _pop(self, session: str) -> None:
+        queue = self._queues.pop(session)
+        queue.popleft()
+        if queue:
+            self._queues[session] = queue  # back of the round-robin order
+
+    def _dispatch(self) -> None:
+        # Futures are completed after the lock is released: their done-callbacks may call release()
+        granted, expired = [], []
+        with self._lock:
+            while self.in_flight < self.max_in_flight:
+                now = time.monotonic()
+                ticket = self._next_ticket(now, expired)
+                if ticket is None:
+                    break
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket.tokens, now))
+                if wait > 0:
+                    self._schedule(wait)
+                    break
+                self._pop(ticket.session)
+                if not ticket.future.set_running_or_notify_cancel():
+                    continue
+                self.requests.take(1)
+                self.tokens.take(ticket.tokens)
+                self.in_flight += 1
+                granted.append(ticket)
+        for ticket in expired:
+            if ticket.future.set_running_or_notify_cancel():
+                ticket.future.set_exception(DeadlineExceeded("deadline passed while waiting for an LLM slot"))
+        for ticket in granted:
+            ticket.future.set_result(ticket)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self._dispatch()
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        """Give up a ticket whose waiter left; a slot granted in the meantime is released."""
+        if not ticket.future.cancel():
+            ticket.future.add_done_callback(
+                lambda future: future.cancelled() or future.exception() or self.release(ticket))
+
+    def release(self, ticket: _Ticket, used_tokens: int = None) -> None:
+        """Free the slot and settle the token estimate against the actual usage."""
+        with self._lock:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                if used_tokens > ticket.tokens:
+                    self.tokens.take(used_tokens - ticket.tokens)
+                else:
+                    self.tokens.give_back(ticket.tokens - used_tokens)
+        self._dispatch()
+
+    def acquire(self, tokens: int, session: str = None, deadline: float = None) -> _Ticket:
+        ticket = self._submit(session or current_session.get(), tokens, deadline)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            ticket.future.result(timeout)
+        except TimeoutError:
+            self._abandon(ticket)
+            raise DeadlineExceeded("deadline passed while waiting for an LLM slot") from None
+        metrics.observe("llm_queue_ms", (time.monotonic() - ticket.queued) * 1000)
+        return ticket
+
+    async def aacquire(self, tokens: int, session: str = None, deadline: float = None) -> _Ticket:
+        ticket = self._submit(session or current_session.get(), tokens, deadline)
+        try:
+            await asyncio.wrap_future(ticket.future)
+        except asyncio.CancelledError:
+            self._abandon(ticket)
+            raise
+        metrics.observe("llm_queue_ms", (time.monotonic() - ticket.queued) * 1000)
+        return ticket
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "waiting_sessions": len(self._queues),
+            }
+
+
+def estimate_tokens(kwargs: dict) -> int:
+    prompt = approx_tokens(json.dumps(kwargs.get("messages", []), default=str))
+    if kwargs.get("tools"):
+        prompt += approx_tokens(json.dumps(kwargs["tools"]))
+    return prompt + (kwargs.get("max_tokens") or COMPLETION_TOKENS_ESTIMATE)
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def backoff_seconds(attempt: int, error: Exception = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it asks for longer."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    response = getattr(error, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        retry_after = 0.0
+    return max(delay, retry_after)
+
+
+def _deadline() -> float:
+    deadline = current_deadline.get() or time.monotonic() + REQUEST_DEADLINE_SECONDS
+    if deadline <= time.monotonic():
+        raise DeadlineExceeded("LLM request deadline passed")
+    return deadline
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+class PooledClient:
+    """`chat.completions.create` over a sync OpenAI client, admitted by the shared scheduler."""
+
+    def __init__(self, client, scheduler: RequestScheduler, max_retries: int = MAX_RETRIES):
+        self._client = client
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        deadline = _deadline()
+        tokens = estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            ticket = self.scheduler.acquire(tokens, deadline=deadline)
+            response = None
+            try:
+                kwargs["timeout"] = max(0.1, deadline - time.monotonic())
+                response = self._client.chat.completions.create(**kwargs)
+                return response
+            except Exception as e:
+                delay = backoff_seconds(attempt, e)
+                if attempt == self.max_retries or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                    raise
+                metrics.increment("llm_retries")
+            finally:
+                self.scheduler.release(ticket, _usage_tokens(response))
+            time.sleep(delay)
+
+
+class AsyncPooledClient(PooledClient):
+    """Async counterpart of `PooledClient` over an AsyncOpenAI client."""
+
+    async def create(self, **kwargs):
+        deadline = _deadline()
+        tokens = estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            ticket = await self.scheduler.aacquire(tokens, deadline=deadline)
+            response = None
+            try:
+                kwargs["timeout"] = max(0.1, deadline - time.monotonic())
+                response = await self._client.chat.completions.create(**kwargs)
+                return response
+            except Exception as e:
+                delay = backoff_seconds(attempt, e)
+                if attempt == self.max_retries or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                    raise
+                metrics.increment("llm_retries")
+            finally:
+                self.scheduler.release(ticket, _usage_tokens(response))
+            await asyncio.sleep(delay)
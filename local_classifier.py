@@ -0,0 +1,126 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from llm_cache import normalize_query
+
+
+def text_features(text: str, n_features: int) -> np.ndarray:
+    """Hashed word unigrams, word bigrams and in-word character trigrams of a text.
+
+    CRC-32 rather than hash(), which is salted per process, so the feature
+    columns of a text are the same in every process and run.
+    """
+    words = normalize_query(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.int64, count=len(features)) % n_features
+
+
+def tfidf_vectors(features: list, n_features: int, idf: np.ndarray = None):
+    """Sparse L2-normalized TF-IDF vectors as (row, column, weight) arrays, plus the idf used.
+
+    `features` holds the hashed features of each text (see `text_features`).
+    """
+    rows = np.repeat(np.arange(len(features)), [len(f) for f in features])
+    columns = np.concatenate(features) if features else np.empty(0, dtype=np.int64)
+
+    keys, term_counts = np.unique(rows * n_features + columns, return_counts=True)
+    rows, columns = keys // n_features, keys % n_features
+    if idf is None:
+        document_counts = np.bincount(columns, minlength=n_features)
+        idf = np.log((1 + len(features)) / (1 + document_counts)) + 1.0
+
+    weights = (1.0 + np.log(term_counts)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(features)))
+    weights /= np.where(norms > 0, norms, 1.0)[rows]
+    return rows, columns, weights, idf
+
+
+class LocalClassifier:
+    """Nearest-centroid TF-IDF classifier trained on the dataset's labeled instructions.
+
+    A held-out slice of the training rows calibrates `threshold`: the lowest
+    top-1/top-2 score margin at which held-out predictions still reach
+    `target_precision`, but never below `min_margin`. Predictions below the
+    threshold or scoring under `min_score` are not confident and should fall
+    back to the LLM.
+    """
+
+    def __init__(self, texts: pd.Series, labels: pd.Series, n_features: int = 2 ** 16,
+                 holdout_share: float = 0.1, target_precision: float = 0.97,
+                 min_margin: float = 0.05, min_score: float = 0.2, seed: int = 0,
+                 features: list = None):
+        self.n_features = n_features
+        self.min_score = min_score
+        labeled = (labels.notna() & texts.notna()).to_numpy()
+        if features is None:
+            features = [text_features(text, n_features) for text in texts.astype(str)]
+        features = [f for f, keep in zip(features, labeled) if keep]
+        labels = pd.Categorical(labels[labeled].astype(str))
+        self.labels = np.asarray(labels.categories)
+        codes = labels.codes.astype(np.int64)
+
+        holdout = np.random.default_rng(seed).random(len(features)) < holdout_share
+        self._fit([f for f, h in zip(features, holdout) if not h], codes[~holdout])
+        calibrated = self._calibrate([f for f, h in zip(features, holdout) if h], codes[holdout], target_precision)
+        self.threshold = max(calibrated, min_margin)
+
+    def _fit(self, features: list, codes: np.ndarray) -> None:
+        rows, columns, weights, self.idf = tfidf_vectors(features, self.n_features)
+        centroids = np.bincount(
+            codes[rows] * self.n_features + columns,
+            weights=weights,
+            minlength=len(self.labels) * self.n_features,
+        ).reshape(len(self.labels), self.n_features)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = (centroids / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+    def _scores(self, features: list) -> np.ndarray:
+        rows, columns, weights, _ = tfidf_vectors(features, self.n_features, self.idf)
+        contributions = self.centroids[:, columns] * weights
+        return np.stack(
+            [np.bincount(rows, weights=c, minlength=len(features)) for c in contributions], axis=1
+        )
+
+    def scores(self, texts) -> np.ndarray:
+        """Cosine similarity of each text to each label centroid, shape (len(texts), n_labels)."""
+        return self._scores([text_features(text, self.n_features) for text in texts])
+
+    def _calibrate(self, features: list, codes: np.ndarray, target_precision: float) -> float:
+        if len(features) == 0:
+            return float("inf")
+        scores = self._scores(features)
+        top2 = np.sort(scores, axis=1)[:, -2:]
+        margins = top2[:, 1] - top2[:, 0]
+        correct = scores.argmax(axis=1) == codes
+
+        order = np.argsort(-margins)
+        precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+        reaching = np.nonzero(precision >= target_precision)[0]
+        return float(margins[order][reaching[-1]]) if len(reaching) else float("inf")
+
+    def predict(self, text: str) -> dict:
+        """Best label, its score, the margin over the runner-up and whether it clears the threshold."""
+        scores = self.scores([text])[0]
+        best, runner_up = np.argsort(scores)[::-1][:2]
+        margin = float(scores[best] - scores[runner_up])
+        return {
+            "label": str(self.labels[best]),
+            "score": round(float(scores[best]), 4),
+            "margin": round(margin, 4),
+            "confident": bool(scores[best] >= self.min_score and margin >= self.threshold),
+        }
+
+
+def train_classifiers(df: pd.DataFrame) -> dict:
+    """Intent and category classifiers trained on the instruction column."""
+    n_features = 2 ** 16
+    features = [text_features(text, n_features) for text in df["instruction"].astype(str)]
+    return {
+        "intent": LocalClassifier(df["instruction"], df["intent"], n_features=n_features, features=features),
+        "category": LocalClassifier(df["instruction"], df["category"], n_features=n_features, features=features),
+    }
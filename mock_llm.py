@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+
+from openai.types.chat import ChatCompletion
+
+from history import approx_tokens
+
+
+def tool_call(name: str, **arguments) -> tuple:
+    """One scripted tool call."""
+    return name, arguments
+
+
+class ScriptedChatCompletions:
+    """Local stand-in for `client.chat.completions` driven by per-question scripts.
+
+    `scripts` maps a user question to its turns: each turn is either a list of
+    tool calls (see `tool_call`) or the final answer text. The turn is chosen
+    from the conversation itself (number of assistant messages after the
+    last user message), so concurrent conversations need no shared state.
+    Requests without `tools` come from the LLM-backed tools and get a label
+    or a summary. Planning requests (plan-and-execute mode) get a plan
+    with the scripted tool calls, each turn depending on the previous one.
+    Every response waits `latency_ms` and reports usage estimated from the
+    request size.
+    """
+
+    def __init__(self, scripts: dict, latency_ms: float = 0.0, default_answer: str = "Done."):
+        self.scripts = scripts
+        self.latency_ms = latency_ms
+        self.default_answer = default_answer
+        self._ids = itertools.count()
+        self.requests = 0
+
+    def respond(self, messages: list, tools: list = None, response_format: dict = None, **_) -> ChatCompletion:
+        self.requests += 1
+        prompt_tokens = approx_tokens(json.dumps(messages, default=str)) + approx_tokens(json.dumps(tools or []))
+        if response_format and "PLAN MODE" in (messages[-1].get("content") or ""):
+            message = {"role": "assistant", "content": self._plan(messages)}
+        elif tools:
+            message = self._agent_turn(messages)
+        else:
+            message = {"role": "assistant", "content": self._tool_reply(messages)}
+        completion_tokens = approx_tokens(json.dumps(message))
+        return ChatCompletion.model_validate({
+            "id": f"mock-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "mock",
+            "choices": [{"index": 0, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop", "message": message}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _agent_turn(self, messages: list) -> dict:
+        last_user = max(i for i, m in enumerate(messages) if m.get("role") == "user")
+        turn = sum(1 for m in messages[last_user:] if m.get("role") == "assistant")
+        turns = self.scripts.get(messages[last_user]["content"], [])
+        step = turns[turn] if turn < len(turns) else self.default_answer
+        if isinstance(step, str):
+            return {"role": "assistant", "content": step}
+        return {"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{next(self._ids)}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(arguments)}}
+            for name, arguments in step
+        ]}
+
+    def _plan(self, messages: list) -> str:
+        last_user = max(i for i, m in enumerate(messages) if m.get("role") == "user")
+        steps, previous = [], []
+        for turn in self.scripts.get(messages[last_user]["content"], []):
+            if isinstance(turn, str):
+                break
+            ids = [f"s{len(steps) + i + 1}" for i in range(len(turn))]
+            steps.extend({"id": step_id, "tool": name, "arguments": arguments, "depends_on": previous}
+                         for step_id, (name, arguments) in zip(ids, turn))
+            previous = ids
+        return json.dumps({"steps": steps})
+
+    def _tool_reply(self, messages: list) -> str:
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        labels = re.findall(r"^- (\S+)$", system, flags=re.MULTILINE)
+        if labels:
+            query = messages[-1]["content"].lower()
+            return next((label for label in labels if label.lower().replace("_", " ") in query), labels[0])
+        return f"Summary of {messages[-1]['content'].count(chr(10) + '- ') + 1} messages."
+
+    def create(self, **kwargs) -> ChatCompletion:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self.respond(**kwargs)
+
+
+class AsyncScriptedChatCompletions(ScriptedChatCompletions):
+    async def create(self, **kwargs) -> ChatCompletion:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.respond(**kwargs)
+
+
+class MockClient:
+    """Object with the `chat.completions.create` shape of the OpenAI clients."""
+
+    def __init__(self, completions: ScriptedChatCompletions):
+        self.chat = self
+        self.completions = completions
+
+
+def mock_clients(scripts: dict, latency_ms: float = 0.0) -> tuple:
+    """Sync and async mock clients sharing the same scripts."""
+    return (
+        MockClient(ScriptedChatCompletions(scripts, latency_ms)),
+        MockClient(AsyncScriptedChatCompletions(scripts, latency_ms)),
+    )
@@ -75,6 +75,25 @@ class CountCategory(BaseModel):
     function_type: Literal["count_category"]
     category_class: CategoryClass
 
+class ValueDistribution(BaseModel):
+    function_type: Literal["value_distribution"]
+    field: StructedField
+    top_k: Optional[int] = Field(default=None, ge=1)
+    condition_field: Optional[StructedField] = None
+    condition_field_value: Optional[Union[CategoryClass, IntentClass]] = None
+
+class IntentCategoryCrosstab(BaseModel):
+    function_type: Literal["intent_category_crosstab"]
+    category_class: Optional[CategoryClass] = None
+
+class SearchText(BaseModel):
+    function_type: Literal["search_text"]
+    query: str
+    search_field: Optional[UnstructedField] = None
+    condition_field: Optional[StructedField] = None
+    condition_field_value: Optional[Union[CategoryClass, IntentClass]] = None
+    number_rows: int = Field(default=3, ge=0, le=7)
+
 class SumValues(BaseModel):
     function_type: Literal["sum_values"]
     values: List[float]
@@ -101,13 +120,17 @@ class ShowExamples(BaseModel):
     condition_field: Optional[StructedField] = None
     condition_field_value: Optional[Union[CategoryClass, IntentClass]] = None
     number_rows: int = Field(default=3, le=7)
+    page: int = Field(default=0, ge=0)
                              
 class SummarizeText(BaseModel):
     function_type: Literal["summarize_text"]
     text_field: Optional[UnstructedField] = None
     condition_field: Optional[StructedField] = None
     condition_field_value: Optional[Union[CategoryClass, IntentClass]] = None
-    number_rows: int = 10
+    number_rows: int = Field(default=10, ge=1)
+    mode: Literal["sample", "map_reduce"] = "sample"
+    page: int = Field(default=0, ge=0)
+    seed: int = 42
 
 class Finish(BaseModel):
     function_type: Literal["finish"]
@@ -119,6 +142,9 @@ FunctionType = Union[
                      SelectSemanticIntent, 
                      SelectSemanticCategory, 
                      CountIntent, CountCategory, 
+                     ValueDistribution, 
+                     IntentCategoryCrosstab, 
+                     SearchText, 
                      SumValues, 
                      MultiplicationFloat, 
                      DivisionFloat, 
@@ -0,0 +1,153 @@
+"""Tool results as the model sees them: compact and within a size budget.
+
+The observation of a tool call is re-sent with every later LLM call, so it
+is encoded compactly (no whitespace, lists of records as one column header
+plus value rows) and held to a per-tool character budget: long texts are
+shortened first, then trailing list items dropped. What was cut is reported
+in a "truncated" entry, and the full result stays in a `ResultStore` under
+the tool call id, for the UI and for plan references.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from pydantic import ValidationError
+
+# Characters of a tool observation by tool; other tools get OBSERVATION_MAX_CHARS
+OBSERVATION_BUDGETS = {
+    "show_examples": 2500,
+    "search_text": 2000,
+    "summarize_text": 3000,
+    "intent_category_crosstab": 4000,
+}
+OBSERVATION_MAX_CHARS = 2000
+# Longest text value kept before the budget forces shorter ones, and the shortest it goes
+TEXT_MAX_CHARS = 400
+TEXT_MIN_CHARS = 80
+# Characters of an error message and validation errors listed
+ERROR_MAX_CHARS = 300
+ERROR_MAX_ITEMS = 3
+# Full results kept for the UI and plan references (least recently used are evicted)
+RESULT_STORE_MAX_ITEMS = 512
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _columnar(value):
+    """Lists of records with the same keys as {"columns": [...], "rows": [[...], ...]}; new containers throughout."""
+    if isinstance(value, dict):
+        return {key: _columnar(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_columnar(item) for item in value]
+        if len(items) > 1 and all(isinstance(item, dict) for item in items):
+            columns = list(items[0])
+            if all(list(item) == columns for item in items[1:]):
+                return {"columns": columns, "rows": [list(item.values()) for item in items]}
+        return items
+    return value
+
+
+def _shorten(value, limit: int, counts: dict):
+    """Copy of `value` with every string longer than `limit` cut to it."""
+    if isinstance(value, str) and len(value) > limit:
+        counts["texts shortened"] += 1
+        return value[:limit] + "…"
+    if isinstance(value, dict):
+        return {key: _shorten(item, limit, counts) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shorten(item, limit, counts) for item in value]
+    return value
+
+
+def _lists(value):
+    """Every list inside `value` with more than one item."""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _lists(item)
+    elif isinstance(value, list):
+        if len(value) > 1:
+            yield value
+        for item in value:
+            yield from _lists(item)
+
+
+def encode_observation(name: str, result, ref: str) -> tuple[str, bool]:
+    """The observation text of a tool result and whether it was truncated to the tool's budget."""
+    budget = OBSERVATION_BUDGETS.get(name, OBSERVATION_MAX_CHARS)
+    compact = _columnar(result)
+    content = _dumps(compact)
+    if len(content) <= budget:
+        return content, False
+
+    counts = {"texts shortened": 0, "items omitted": 0}
+    limit = TEXT_MAX_CHARS
+    while True:
+        counts["texts shortened"] = 0
+        shortened = _shorten(compact, limit, counts)
+        content = _dumps(shortened)
+        if len(content) <= budget or limit <= TEXT_MIN_CHARS:
+            break
+        limit = max(TEXT_MIN_CHARS, limit // 2)
+
+    def with_note():
+        note = {key: n for key, n in counts.items() if n}
+        note["full result"] = ref
+        if isinstance(shortened, dict):
+            return _dumps({**shortened, "truncated": note})
+        return _dumps({"result": shortened, "truncated": note})
+
+    content = with_note()
+    while len(content) > budget:
+        lists = list(_lists(shortened))
+        if not lists:
+            break
+        max(lists, key=lambda items: len(_dumps(items))).pop()
+        counts["items omitted"] += 1
+        content = with_note()
+    if len(content) > budget:
+        content = content[:budget] + f"… [cut at {budget} characters, full result: {ref}]"
+    return content, True
+
+
+def format_error(error: Exception) -> str:
+    """Short error text for the model: the first validation errors without inputs and links."""
+    if isinstance(error, ValidationError):
+        problems = []
+        for item in error.errors()[:ERROR_MAX_ITEMS]:
+            location = item["loc"][2:] if item["loc"][:1] == ("function_call",) else item["loc"]  # drop the union tag
+            problems.append(f"{'.'.join(str(part) for part in location) or 'arguments'}: {item['msg']}")
+        more = error.error_count() - len(problems)
+        message = "invalid arguments: " + "; ".join(problems) + (f" (+{more} more)" if more > 0 else "")
+    else:
+        message = str(error)
+    if len(message) > ERROR_MAX_CHARS:
+        message = message[:ERROR_MAX_CHARS] + "…"
+    return f"Error: {message}"
+
+
+class ResultStore:
+    """Full tool results by reference (the tool call id), bounded LRU."""
+
+    def __init__(self, max_items: int = RESULT_STORE_MAX_ITEMS):
+        self.max_items = max_items
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, ref: str, result) -> None:
+        with self._lock:
+            self._results[ref] = result
+            self._results.move_to_end(ref)
+            while len(self._results) > self.max_items:
+                self._results.popitem(last=False)
+
+    def get(self, ref: str, default=None):
+        with self._lock:
+            if ref not in self._results:
+                return default
+            self._results.move_to_end(ref)
+            return self._results[ref]
+
+    def __len__(self) -> int:
+        return len(self._results)
@@ -0,0 +1,106 @@
+import json
+import re
+
+from pydantic import ValidationError
+
+from model import FunctionInput
+
+# Largest plan the executor accepts
+PLAN_MAX_STEPS = 30
+
+# Instruction appended after the conversation for the planning call
+planner_prompt = """
+PLAN MODE. Do not answer yet. Plan all tool calls needed to answer the last user message and reply with JSON only:
+{"steps": [{"id": "s1", "tool": "<tool name>", "arguments": {...}, "depends_on": []}, ...]}
+
+Rules:
+- Use only the available tools and their parameter schemas.
+- Steps without dependencies run in parallel; list in depends_on the ids of steps whose results a step needs.
+- An argument value "$<id>.<key>" is replaced by that key of the result of step <id>, "$<id>" by the whole result
+  (e.g. select_semantic_intent returns {"selected_intent": ...}, count_intent/count_category return {"number of rows": ...},
+  sum_values returns {"sum": ...}, multiplication_float and division_float return a number). Referenced steps must be in depends_on.
+- Prefer one value_distribution or intent_category_crosstab call over many counts.
+- Reply {"steps": []} if no tool is needed.
+""" + f"- At most {PLAN_MAX_STEPS} steps.\n"
+
+_REFERENCE = re.compile(r"^\$(\w+)(?:\.(.+))?$")
+
+
+class PlanError(ValueError):
+    """The planner output is not an executable plan."""
+
+
+def _references(value) -> set:
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        return {match.group(1)} if match else set()
+    if isinstance(value, list):
+        return set().union(*(_references(item) for item in value))
+    if isinstance(value, dict):
+        return set().union(*(_references(item) for item in value.values()))
+    return set()
+
+
+def parse_plan(text: str, tool_names: set) -> list:
+    """Validate the planner output and group its steps into waves that can run in parallel.
+
+    Steps without references are validated against their input model up
+    front; steps using results of other steps are validated when they run.
+    Raises PlanError on anything the executor could not run.
+    """
+    try:
+        steps = json.loads(text)["steps"]
+    except (TypeError, ValueError, KeyError) as e:
+        raise PlanError(f"plan is not valid JSON with 'steps': {e}") from None
+    if not isinstance(steps, list) or len(steps) > PLAN_MAX_STEPS:
+        raise PlanError(f"plan must be a list of at most {PLAN_MAX_STEPS} steps")
+
+    by_id = {}
+    for step in steps:
+        if not isinstance(step, dict) or not isinstance(step.get("id"), str) or step["id"] in by_id:
+            raise PlanError(f"step ids must be unique strings: {step!r}")
+        if step.get("tool") not in tool_names:
+            raise PlanError(f"unknown tool in step {step['id']}: {step.get('tool')!r}")
+        arguments = step.setdefault("arguments", {})
+        depends_on = step.setdefault("depends_on", [])
+        if not isinstance(arguments, dict) or not isinstance(depends_on, list):
+            raise PlanError(f"step {step['id']} needs an 'arguments' object and a 'depends_on' list")
+        references = _references(arguments)
+        if not references <= set(depends_on):
+            raise PlanError(f"step {step['id']} references {sorted(references - set(depends_on))} without depending on them")
+        if not references:
+            try:
+                FunctionInput(function_call={**arguments, "function_type": step["tool"]})
+            except ValidationError as e:
+                raise PlanError(f"invalid arguments in step {step['id']}: {e.errors()[0]['msg']}") from None
+        by_id[step["id"]] = step
+
+    # Topological levels; whatever cannot be scheduled is part of a cycle or depends on a missing step
+    waves, done = [], set()
+    while len(done) < len(by_id):
+        wave = [step for step in by_id.values() if step["id"] not in done and set(step["depends_on"]) <= done]
+        if not wave:
+            raise PlanError(f"plan has a cycle or unknown dependency among {sorted(set(by_id) - done)}")
+        waves.append(wave)
+        done.update(step["id"] for step in wave)
+    return waves
+
+
+def resolve_references(value, results: dict):
+    """Replace "$id.key" / "$id" strings with values from the results of earlier steps."""
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        if not match:
+            return value
+        step_id, key = match.groups()
+        result = results[step_id]
+        if key is None:
+            return result
+        if not isinstance(result, dict) or key not in result:
+            raise PlanError(f"result of step {step_id} has no key {key!r}")
+        return result[key]
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if isinstance(value, dict):
+        return {name: resolve_references(item, results) for name, item in value.items()}
+    return value
@@ -1,10 +1,26 @@
-from config import client, model_name, tools
+from config import runtime, system_prompt
+import asyncio
 import json
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fast_path import cache_answer, fast_answer, is_follow_up
+from history import HISTORY_TOKEN_BUDGET, compact_history
+from llm_client import current_deadline, current_session
+from observations import encode_observation, format_error
+from planner import PlanError, parse_plan, planner_prompt, resolve_references
+from tool_registry import ToolRegistry
+from tool_schema import relevant_tools, tool_tokens
+from tracing import RunTrace, StepSpan, ToolSpan, export_trace, metrics
 from model import (
                    DatasetOverview, 
                    SelectSemanticIntent, 
                    SelectSemanticCategory, 
                    CountIntent, CountCategory, 
+                   ValueDistribution, 
+                   IntentCategoryCrosstab, 
+                   SearchText, 
                    SumValues, 
                    MultiplicationFloat, 
                    DivisionFloat, 
@@ -20,53 +36,127 @@ from tools import (
                    select_semantic_category,
                    count_intent,
                    count_category,
+                   value_distribution,
+                   intent_category_crosstab,
+                   search_text,
                    sum_values,
                    multiplication_float,
                    division_float,
                    show_examples,
                    summarize_text,
-                   finish
+                   finish,
+                   aselect_semantic_intent,
+                   aselect_semantic_category,
+                   asummarize_text
                    )
 
+# Registry routing validated inputs to the tools; deterministic results are memoized per dataset version
+def _dataset_version():
+    backend = runtime.backend
+    return backend.version or id(backend)
+
+registry = ToolRegistry(dataset_version=_dataset_version)
+registry.register("get_dataset_overview", DatasetOverview, get_dataset_overview, deterministic=True)
+registry.register("select_semantic_intent", SelectSemanticIntent, select_semantic_intent, aselect_semantic_intent)
+registry.register("select_semantic_category", SelectSemanticCategory, select_semantic_category, aselect_semantic_category)
+registry.register("count_intent", CountIntent, count_intent, deterministic=True)
+registry.register("count_category", CountCategory, count_category, deterministic=True)
+registry.register("value_distribution", ValueDistribution, value_distribution, deterministic=True)
+registry.register("intent_category_crosstab", IntentCategoryCrosstab, intent_category_crosstab, deterministic=True)
+registry.register("search_text", SearchText, search_text, deterministic=True)
+registry.register("sum_values", SumValues, sum_values, deterministic=True, uses_dataset=False)
+registry.register("multiplication_float", MultiplicationFloat, multiplication_float, deterministic=True, uses_dataset=False)
+registry.register("division_float", DivisionFloat, division_float, deterministic=True, uses_dataset=False)
+registry.register("show_examples", ShowExamples, show_examples, deterministic=True)
+registry.register("summarize_text", SummarizeText, summarize_text, asummarize_text)
+registry.register("finish", Finish, finish, deterministic=True, uses_dataset=False)
+
 # The function to route inputs to an appropriate tool
+def execute_function(function_call: FunctionType, memoize: bool = True) -> dict:
+    return registry.execute(function_call, memoize=memoize)
 
-def execute_function(function_call: FunctionType) -> dict:
-
-    if isinstance(function_call, DatasetOverview):
-        return get_dataset_overview(function_call)
-    elif isinstance(function_call, SelectSemanticIntent):
-        return select_semantic_intent(function_call)
-    elif isinstance(function_call, SelectSemanticCategory):
-        return select_semantic_category(function_call)
-    elif isinstance(function_call, CountIntent):
-        return count_intent(function_call)
-    elif isinstance(function_call, CountCategory):
-        return count_category(function_call)
-    elif isinstance(function_call, SumValues):
-        return sum_values(function_call)
-    elif isinstance(function_call, MultiplicationFloat):
-        return multiplication_float(function_call)
-    elif isinstance(function_call, DivisionFloat):
-        return division_float(function_call)
-    elif isinstance(function_call, ShowExamples):
-        return show_examples(function_call)
-    elif isinstance(function_call, SummarizeText):
-        return summarize_text(function_call)
-    elif isinstance(function_call, Finish):
-        return finish(function_call)
+TOOL_MAX_WORKERS = 8
+TOOL_TIMEOUT_SECONDS = 60
+STEP_TIMEOUT_SECONDS = 60
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
 
-# The ReAct Agent function
-def process_user_query_react(messages: list) -> tuple[str, list]:
-    """ReAct agent to process user queries interactively."""
-
-    for step in range(20):  # think-observe-react step limit
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            temperature=0
+async def aexecute_function(function_call: FunctionType) -> dict:
+    """Run the async version of LLM-backed tools; the local tools run on a bounded thread pool."""
+    return await registry.aexecute(function_call, tool_executor)
+
+async def arun_tool_call(function, timeout: float = TOOL_TIMEOUT_SECONDS, step: StepSpan = None) -> dict:
+    """Validate and execute one tool call, returning its tool message."""
+    function_call = function.function
+    span = ToolSpan(name=function_call.name, tool_call_id=function.id, start_ns=time.time_ns())
+    if step is not None:
+        step.tools.append(span)
+    started = time.perf_counter()
+    current_deadline.set(time.monotonic() + timeout)  # LLM calls of the tool retry only within its timeout
+    try:
+        arguments = json.loads(function_call.arguments)
+        arguments["function_type"] = function_call.name
+        function_input = FunctionInput(function_call=arguments)
+        result = await asyncio.wait_for(aexecute_function(function_input.function_call), timeout)
+        runtime.result_store.put(function.id, result)
+        content, span.truncated = encode_observation(function_call.name, result, function.id)
+    except asyncio.TimeoutError:
+        content = f"Error: tool '{function_call.name}' timed out after {timeout} seconds"
+        span.error = "timeout"
+    except Exception as e:
+        content = format_error(e)
+        span.error = type(e).__name__
+
+    span.duration_ms = (time.perf_counter() - started) * 1000
+    span.result_chars = len(content)
+    return {"role": "tool", "tool_call_id": function.id, "content": content}
+
+async def arun_tool_calls(tool_calls: list, timeout: float = TOOL_TIMEOUT_SECONDS, step: StepSpan = None) -> list:
+    """Run the tool calls of one step concurrently; results keep the original call order."""
+    return list(await asyncio.gather(*(arun_tool_call(function, timeout, step) for function in tool_calls)))
+
+# Think-observe-react step limit
+MAX_STEPS = 20
+STEP_LIMIT_ANSWER = "Too many steps. Reached iteration limit."
+# Agent modes: "react" asks the model after every tool step, "plan" plans all tool calls in one call first
+AGENT_MODES = ("react", "plan")
+
+def request_tools(messages: list, step: StepSpan) -> list:
+    """Tools sent with an LLM call: all of them, or with TOOL_SELECTION=relevant those matching the conversation.
+
+    Sending all tools keeps the prompt prefix identical across calls (provider
+    prompt caching); the relevant subset sends fewer tokens per step.
+    """
+    tools = runtime.tools
+    if os.environ.get("TOOL_SELECTION", "all") == "relevant":
+        tools = relevant_tools(tools, messages)
+    step.request_tools = len(tools)
+    step.tools_tokens = sum(tool_tokens(tools).values())
+    return tools
+
+async def _areact_loop(messages: list, step_timeout: float, history_budget: int, trace: RunTrace,
+                       max_steps: int = MAX_STEPS) -> tuple[str, list]:
+    for step in range(max_steps):
+        step_span = trace.start_step()
+        step_started = time.perf_counter()
+        request_messages = compact_history(messages, history_budget)
+        step_span.request_messages = len(request_messages)
+        step_span.request_chars = sum(len(m.get("content") or "") for m in request_messages)
+
+        current_deadline.set(time.monotonic() + step_timeout)
+        response = await asyncio.wait_for(
+            runtime.async_client.chat.completions.create(
+                model=runtime.model_name,
+                messages=request_messages,
+                tools=request_tools(messages, step_span),
+                tool_choice="auto",
+                temperature=0
+            ),
+            step_timeout
         )
+        step_span.llm_latency_ms = (time.perf_counter() - step_started) * 1000
+        if response.usage:
+            step_span.prompt_tokens = response.usage.prompt_tokens
+            step_span.completion_tokens = response.usage.completion_tokens
 
         assistant_message = response.choices[0].message
         
@@ -78,35 +168,191 @@ def process_user_query_react(messages: list) -> tuple[str, list]:
                 "content": None,
                 "tool_calls": [tc.model_dump() for tc in assistant_message.tool_calls]
             })
-            for function in assistant_message.tool_calls:
-                function_call = function.function
-                function_name = function_call.name
-                arguments = json.loads(function_call.arguments)
-                arguments["function_type"] = function_name
-
-                try:
-                    function_input = FunctionInput(function_call=arguments)
-                    result = execute_function(function_input.function_call)
-
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": function.id,
-                        "content": json.dumps(result)
-                    })
-                except Exception as e:
-                    error_msg = f"Error: {str(e)}"
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": function.id,
-                        "content": error_msg
-                    })
+            messages.extend(await arun_tool_calls(assistant_message.tool_calls, step=step_span))
+            step_span.duration_ms = (time.perf_counter() - step_started) * 1000
 
         else:
             # Final response without function call
+            step_span.duration_ms = (time.perf_counter() - step_started) * 1000
             messages.append({
                 "role": "assistant",
                 "content": assistant_message.content
             })
             return assistant_message.content, messages
 
-    return "Too many steps. Reached iteration limit.", messages
\ No newline at end of file
+    return STEP_LIMIT_ANSWER, messages
+
+async def _aplan(messages: list, step_timeout: float, history_budget: int, trace: RunTrace) -> tuple:
+    """One LLM call producing the tool plan; returns its waves (None if unusable) and the step span."""
+    step_span = trace.start_step()
+    step_started = time.perf_counter()
+    request_messages = compact_history(messages, history_budget) + [{"role": "system", "content": planner_prompt}]
+    step_span.request_messages = len(request_messages)
+    step_span.request_chars = sum(len(m.get("content") or "") for m in request_messages)
+
+    current_deadline.set(time.monotonic() + step_timeout)
+    response = await asyncio.wait_for(
+        runtime.async_client.chat.completions.create(
+            model=runtime.model_name,
+            messages=request_messages,
+            tools=request_tools(messages, step_span),
+            tool_choice="none",
+            response_format={"type": "json_object"},
+            temperature=0
+        ),
+        step_timeout
+    )
+    step_span.llm_latency_ms = (time.perf_counter() - step_started) * 1000
+    if response.usage:
+        step_span.prompt_tokens = response.usage.prompt_tokens
+        step_span.completion_tokens = response.usage.completion_tokens
+
+    try:
+        return parse_plan(response.choices[0].message.content, {tool.name for tool in registry}), step_span
+    except PlanError as e:
+        trace.fallback = str(e)
+        return None, step_span
+
+async def _aexecute_plan(waves: list, messages: list, step_span: StepSpan, trace: RunTrace) -> None:
+    """Run the plan wave by wave, the calls of a wave in parallel.
+
+    Every wave is appended to `messages` as an assistant tool-call message
+    with its tool results, exactly like a ReAct step. Stops early (recording
+    the reason in `trace.fallback`) if a reference cannot be resolved.
+    """
+    from openai.types.chat import ChatCompletionMessageToolCall
+
+    results = {}
+    plan_id = secrets.token_hex(4)  # tool call ids key the shared result store
+    for wave in waves:
+        try:
+            tool_calls = [
+                ChatCompletionMessageToolCall.model_validate({
+                    "id": f"plan_{plan_id}_{len(messages)}_{step['id']}",
+                    "type": "function",
+                    "function": {"name": step["tool"],
+                                 "arguments": json.dumps(resolve_references(step["arguments"], results))},
+                })
+                for step in wave
+            ]
+        except PlanError as e:
+            trace.fallback = str(e)
+            return
+
+        messages.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [tc.model_dump() for tc in tool_calls]
+        })
+        tool_messages = await arun_tool_calls(tool_calls, step=step_span)
+        messages.extend(tool_messages)
+        for step, message in zip(wave, tool_messages):
+            # References resolve against the full result, not the budgeted observation
+            results[step["id"]] = runtime.result_store.get(message["tool_call_id"], message["content"])
+
+async def _aplan_and_execute(messages: list, step_timeout: float, history_budget: int,
+                             trace: RunTrace) -> tuple[str, list]:
+    """Plan-and-execute: plan all tool calls in one LLM call, run them, then let the model answer.
+
+    The answer is composed by the ReAct loop, which continues from the
+    executed plan: usually it answers in its first call, but it can still
+    call tools if the plan fell short. A plan that fails validation falls
+    back to the plain ReAct loop.
+    """
+    step_started = time.perf_counter()
+    waves, step_span = await _aplan(messages, step_timeout, history_budget, trace)
+    if waves:
+        await _aexecute_plan(waves, messages, step_span, trace)
+    step_span.duration_ms = (time.perf_counter() - step_started) * 1000
+    return await _areact_loop(messages, step_timeout, history_budget, trace, max_steps=MAX_STEPS - 1)
+
+# The ReAct Agent function
+async def aprocess_user_query_react(messages: list, step_timeout: float = STEP_TIMEOUT_SECONDS,
+                                    history_budget: int = HISTORY_TOKEN_BUDGET,
+                                    trace: RunTrace = None, session_id: str = None,
+                                    mode: str = None, fast_path: bool = True) -> tuple[str, list]:
+    """Async ReAct agent; each LLM call must finish within `step_timeout` seconds.
+
+    `messages` keeps the full history; the model receives a view compacted to
+    about `history_budget` tokens. Steps, LLM usage and tool timings are
+    recorded in `trace`, added to the global metrics and exported when
+    AGENT_TRACE_PATH is set. LLM requests are queued fairly under `session_id`
+    against those of other sessions. `mode` is "react" or "plan" (see
+    `_aplan_and_execute`); it defaults to AGENT_MODE or "react".
+
+    With `fast_path`, template questions and cached answers are returned
+    without running the agent (trace mode "template" or "cache"), and answers
+    to questions that do not depend on earlier turns are cached.
+    """
+    mode = mode or os.environ.get("AGENT_MODE", "react")
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode: {mode}")
+    if session_id:
+        current_session.set(session_id)
+    if trace is None:
+        trace = RunTrace()
+    trace.mode = mode
+    if not trace.question:
+        trace.question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+    started = time.perf_counter()
+    try:
+        cacheable = fast_path and not is_follow_up(messages)
+        hit = fast_answer(trace.question, use_cache=cacheable) if fast_path else None
+        if hit:
+            trace.mode, answer = hit
+            messages.append({"role": "assistant", "content": answer})
+        else:
+            run = _aplan_and_execute if mode == "plan" else _areact_loop
+            answer, messages = await run(messages, step_timeout, history_budget, trace)
+            if cacheable and answer and answer != STEP_LIMIT_ANSWER and not trace.totals()["tool_errors"]:
+                cache_answer(trace.question, answer)
+        trace.answer_chars = len(answer or "")
+        return answer, messages
+    except BaseException as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.duration_ms = (time.perf_counter() - started) * 1000
+        metrics.record_run(trace)
+        export_trace(trace)
+
+def process_user_query_react(messages: list, trace: RunTrace = None, session_id: str = None,
+                             mode: str = None, fast_path: bool = True) -> tuple[str, list]:
+    """ReAct agent to process user queries interactively.
+
+    Synchronous wrapper running the async agent on the shared background loop.
+    """
+    return runtime.event_loop.run(aprocess_user_query_react(messages, trace=trace, session_id=session_id, mode=mode,
+                                                               fast_path=fast_path))
+
+
+async def aprocess_session_query(session_id: str, question: str, trace: RunTrace = None, mode: str = None,
+                                 fast_path: bool = True) -> str:
+    """Answer `question` in the stored conversation of `session_id` and persist the new messages.
+
+    The conversation is read from `runtime.session_store` (a new one starts
+    with the system prompt); the question and everything the agent adds are
+    appended to it, so the caller only needs to keep the session id.
+    """
+    store = runtime.session_store
+    messages = store.messages(session_id)
+    stored = len(messages)
+    if not messages:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": question})
+    asked = messages[stored:]
+    try:
+        answer, messages = await aprocess_user_query_react(messages, trace=trace, session_id=session_id,
+                                                           mode=mode, fast_path=fast_path)
+    except BaseException:
+        store.append(session_id, asked)  # keep the question, not a half-finished tool exchange
+        raise
+    store.append(session_id, messages[stored:])
+    return answer
+
+def process_session_query(session_id: str, question: str, trace: RunTrace = None, mode: str = None,
+                          fast_path: bool = True) -> str:
+    """Synchronous `aprocess_session_query` on the shared background loop."""
+    return runtime.event_loop.run(aprocess_session_query(session_id, question, trace=trace, mode=mode,
+                                                         fast_path=fast_path))
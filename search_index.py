@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+# Free-text fields covered by the index
+SEARCH_FIELDS = ("instruction", "response")
+
+_TOKEN = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall(text.casefold())
+
+
+class FieldIndex:
+    """Posting lists of one text field: for every token, the sorted row positions containing it."""
+
+    def __init__(self, vocabulary: list, offsets: np.ndarray, postings: np.ndarray):
+        self.vocabulary = vocabulary
+        self.token_ids = {token: i for i, token in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.postings = postings
+
+    @classmethod
+    def build(cls, texts) -> "FieldIndex":
+        token_ids, rows, vocabulary = [], [], {}
+        for row, text in enumerate(texts):
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in set(tokenize(str(text)))]
+            token_ids.extend(ids)
+            rows.extend([row] * len(ids))
+        token_ids = np.asarray(token_ids, dtype=np.int32)
+        rows = np.asarray(rows, dtype=np.int32)
+        order = np.lexsort((rows, token_ids))
+        offsets = np.searchsorted(token_ids[order], np.arange(len(vocabulary) + 1)).astype(np.int64)
+        return cls(list(vocabulary), offsets, rows[order])
+
+    def rows(self, token: str) -> np.ndarray:
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[token_id]:self.offsets[token_id + 1]]
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "postings.npy"), self.postings)
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "FieldIndex":
+        with open(os.path.join(path, "vocabulary.json"), "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        return cls(
+            vocabulary,
+            np.load(os.path.join(path, "offsets.npy")),
+            np.load(os.path.join(path, "postings.npy"), mmap_mode="r"),
+        )
+
+
+def phrase_pattern(tokens: tuple) -> str:
+    """Case-insensitive regex matching the tokens as consecutive words."""
+    return r"\b" + r"\W+".join(re.escape(token) for token in tokens) + r"\b"
+
+
+def parse_query(query: str) -> list:
+    """Split a query into clauses combined with AND.
+
+    Each clause is a list of alternatives joined by OR; an alternative is a
+    tuple of tokens (one token for a term, several for a "quoted phrase").
+    A leading '-' or NOT negates the next term or phrase. Returns
+    (negated, alternatives) pairs.
+    """
+    clauses, negate_next, join_next = [], False, False
+    for match in _QUERY_PART.finditer(query):
+        minus, phrase, word = match.groups()
+        if word in ("OR", "|"):
+            join_next = bool(clauses)
+            continue
+        if word in ("AND", "&"):
+            continue
+        if word == "NOT":
+            negate_next = True
+            continue
+
+        negated = negate_next or bool(minus)
+        if word is not None and word.startswith("-") and len(word) > 1:
+            negated, word = True, word[1:]
+        tokens = tuple(tokenize(phrase if phrase is not None else word))
+        negate_next = False
+        if not tokens:
+            continue
+        if join_next and not negated and not clauses[-1][0]:
+            clauses[-1][1].append(tokens)
+        else:
+            clauses.append((negated, [tokens]))
+        join_next = False
+    return clauses
+
+
+class SearchIndex:
+    """Inverted index over the instruction and response fields with boolean and phrase queries."""
+
+    def __init__(self, fields: dict, texts: dict):
+        self.fields = fields
+        self.texts = texts
+
+    @classmethod
+    def build(cls, df) -> "SearchIndex":
+        return cls({field: FieldIndex.build(df[field]) for field in SEARCH_FIELDS},
+                   {field: df[field] for field in SEARCH_FIELDS})
+
+    def _phrase_rows(self, field: str, tokens: tuple) -> np.ndarray:
+        index = self.fields[field]
+        rows = index.rows(tokens[0])
+        for token in tokens[1:]:
+            rows = np.intersect1d(rows, index.rows(token), assume_unique=True)
+        if len(tokens) == 1 or len(rows) == 0:
+            return np.asarray(rows)
+
+        # Verify word order on the candidate rows only (vectorized regex over the Arrow strings)
+        candidates = self.texts[field].iloc[np.asarray(rows)]
+        keep = candidates.str.contains(phrase_pattern(tokens), case=False, regex=True, na=False).to_numpy(dtype=bool)
+        return np.asarray(rows)[keep]
+
+    def search(self, query: str, field: str = "instruction", within: np.ndarray = None) -> np.ndarray:
+        """Sorted row positions matching `query`, optionally restricted to the sorted positions `within`.
+
+        A query of only negative terms matches every row (of `within`) without them.
+        """
+        clauses = parse_query(query)
+        positive = [alternatives for negated, alternatives in clauses if not negated]
+        negative = [alternatives for negated, alternatives in clauses if negated]
+        if not clauses and within is None:
+            return np.empty(0, dtype=np.int32)
+        if not positive and within is None:
+            within = np.arange(len(self.texts[field]), dtype=np.int32)  # only negative terms: all rows minus them
+
+        def clause_rows(alternatives):
+            rows = np.empty(0, dtype=np.int32)
+            for tokens in alternatives:
+                rows = np.union1d(rows, self._phrase_rows(field, tokens))
+            return rows
+
+        # Rarest clause first keeps intermediate results small
+        matches = sorted((clause_rows(alternatives) for alternatives in positive), key=len)
+        rows = matches[0] if matches else np.asarray(within)
+        for other in matches[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        if within is not None and matches:
+            rows = np.intersect1d(rows, within, assume_unique=True)
+        for alternatives in negative:
+            rows = np.setdiff1d(rows, clause_rows(alternatives), assume_unique=True)
+        return rows
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        for field, index in self.fields.items():
+            index.save(os.path.join(tmp_path, field))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, df) -> "SearchIndex":
+        return cls({field: FieldIndex.load(os.path.join(path, field)) for field in SEARCH_FIELDS},
+                   {field: df[field] for field in SEARCH_FIELDS})
+
+
+def load_search_index(dataset_index, cache_dir: str) -> SearchIndex:
+    """Load the index stored next to the dataset cache for this dataset version, building it if missing."""
+    if not dataset_index.version:
+        return SearchIndex.build(dataset_index.df)
+    path = os.path.join(cache_dir, f"search-{dataset_index.version[:16]}")
+    if os.path.isdir(path):
+        return SearchIndex.load(path, dataset_index.df)
+    search_index = SearchIndex.build(dataset_index.df)
+    search_index.save(path)
+    return search_index
@@ -0,0 +1,149 @@
+"""Conversations persisted in SQLite, keyed by session id.
+
+Messages are appended to disk as they are produced and read back only when a
+session needs them, so a Streamlit session keeps just its id in memory and
+resumes after a restart. Recently used conversations stay resident up to
+`max_resident_sessions`; sessions idle for `idle_seconds` are dropped from
+memory (not from disk), and sessions untouched for `ttl_seconds` are deleted.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_SESSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache", "sessions.sqlite")
+
+
+class SessionStore:
+    """Append-only message log and small state record (question count, active flag) per session."""
+
+    def __init__(self, path: str = DEFAULT_SESSION_PATH, max_resident_sessions: int = 64,
+                 idle_seconds: float = 600, ttl_seconds: float = 30 * 24 * 3600):
+        self.max_resident_sessions = max_resident_sessions
+        self.idle_seconds = idle_seconds
+        self.ttl_seconds = ttl_seconds
+        self._resident = OrderedDict()  # session id -> (messages, last access)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, step INTEGER NOT NULL, active INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages "
+            "(session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def _touch(self, session_id: str, now: float) -> None:
+        self._db.execute(
+            "INSERT INTO sessions (session_id, step, active, updated) VALUES (?, 0, 1, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET updated = excluded.updated",
+            (session_id, now),
+        )
+
+    def _evict_resident(self, now: float) -> None:
+        while self._resident:
+            session_id, (_, accessed) = next(iter(self._resident.items()))
+            if len(self._resident) <= self.max_resident_sessions and now - accessed < self.idle_seconds:
+                break
+            del self._resident[session_id]
+
+    def _load(self, session_id: str, now: float) -> list:
+        entry = self._resident.pop(session_id, None)
+        if entry is None:
+            rows = self._db.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            entry = ([json.loads(row[0]) for row in rows], now)
+        self._resident[session_id] = (entry[0], now)
+        self._evict_resident(now)
+        return entry[0]
+
+    def messages(self, session_id: str) -> list:
+        """Copy of the conversation of a session (empty for a new one)."""
+        with self._lock:
+            return list(self._load(session_id, time.time()))
+
+    def append(self, session_id: str, messages: list) -> None:
+        """Add messages to the end of the conversation."""
+        now = time.time()
+        with self._lock:
+            stored = self._load(session_id, now)
+            self._db.execute("BEGIN")
+            try:
+                self._touch(session_id, now)
+                self._db.executemany(
+                    "INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+                    [(session_id, len(stored) + i, json.dumps(message, ensure_ascii=False))
+                     for i, message in enumerate(messages)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            stored.extend(messages)
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._delete_expired(now)
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            entry = self._resident.get(session_id)
+            if entry is not None:
+                return len(entry[0])
+            return self._db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def page(self, session_id: str, start: int, end: int) -> list:
+        """Messages `start`..`end` of a conversation, read from disk unless it is resident."""
+        with self._lock:
+            entry = self._resident.get(session_id)
+            if entry is not None:
+                return entry[0][start:end]
+            rows = self._db.execute(
+                "SELECT message FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, end),
+            ).fetchall()
+            return [json.loads(row[0]) for row in rows]
+
+    def state(self, session_id: str) -> dict:
+        """Questions asked and whether the session still accepts questions."""
+        with self._lock:
+            row = self._db.execute("SELECT step, active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return {"step": row[0], "active": bool(row[1])} if row else {"step": 0, "active": True}
+
+    def set_state(self, session_id: str, step: int, active: bool) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (session_id, step, active, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET step = excluded.step, active = excluded.active, "
+                "updated = excluded.updated",
+                (session_id, step, int(active), time.time()),
+            )
+
+    def clear(self, session_id: str) -> None:
+        """Forget the conversation and state of a session."""
+        with self._lock:
+            self._resident.pop(session_id, None)
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _delete_expired(self, now: float) -> None:
+        expired = "SELECT session_id FROM sessions WHERE updated < ?"
+        self._db.execute(f"DELETE FROM messages WHERE session_id IN ({expired})", (now - self.ttl_seconds,))
+        self._db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl_seconds,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident_sessions": len(self._resident),
+                "resident_messages": sum(len(messages) for messages, _ in self._resident.values()),
+                "stored_sessions": self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            }
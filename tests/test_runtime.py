@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import pytest
+
+from config import RuntimeContext, runtime
+
+
+def test_get_builds_a_resource_once():
+    calls = []
+    context = RuntimeContext()
+    context.register("thing", lambda: calls.append(1) or len(calls))
+    assert context.get("thing") == 1
+    assert context.get("thing") == 1
+    assert calls == [1]
+
+
+def test_configure_rejects_unknown_resources():
+    with pytest.raises(KeyError):
+        RuntimeContext(unknown=1)
+
+
+def test_real_async_client_is_built_once_per_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    runtime.reset("async_client", "llm_scheduler")
+
+    async def clients():
+        return runtime.async_client, runtime.async_client
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(asyncio.run(clients())), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "building the async client deadlocked"
+    runtime.reset("async_client", "llm_scheduler")
+    first, second = result[0]
+    assert first is second
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Upper bound of memoized tool results kept in the process
+MEMO_MAX_ITEMS = 1024
+
+
+@dataclass(frozen=True)
+class Tool:
+    """One tool: its input model, implementation and caching properties.
+
+    `deterministic` tools return the same result for the same input on the
+    same dataset and are memoized. `uses_dataset` adds the dataset version to
+    the memo key, so results never outlive the data they were computed on.
+    """
+    name: str
+    model: type
+    function: Callable
+    async_function: Optional[Callable] = None
+    deterministic: bool = False
+    uses_dataset: bool = True
+
+
+class ResultMemo:
+    """Thread-safe LRU of tool results with hit/miss/eviction counters."""
+
+    def __init__(self, max_items: int = MEMO_MAX_ITEMS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True, self._items[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class ToolRegistry:
+    """Maps validated tool inputs to their implementations and memoizes deterministic results.
+
+    Memoized results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, dataset_version: Callable = None, max_items: int = MEMO_MAX_ITEMS):
+        self._tools = {}
+        self._dataset_version = dataset_version or (lambda: None)
+        self.memo = ResultMemo(max_items)
+
+    def register(self, name: str, model: type, function: Callable, async_function: Callable = None,
+                 deterministic: bool = False, uses_dataset: bool = True) -> None:
+        self._tools[model] = Tool(name, model, function, async_function, deterministic, uses_dataset)
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def tool(self, function_call) -> Tool:
+        try:
+            return self._tools[type(function_call)]
+        except KeyError:
+            raise ValueError(f"Unknown tool input: {type(function_call).__name__}") from None
+
+    def memo_key(self, tool: Tool, function_call) -> tuple:
+        """Canonical JSON of the validated input plus the dataset version.
+
+        The JSON of a validated model is canonical: defaults are filled in and
+        fields always come in declaration order, so equivalent calls share a key.
+        """
+        return (self._dataset_version() if tool.uses_dataset else None, function_call.model_dump_json())
+
+    def _lookup(self, tool: Tool, function_call) -> tuple:
+        key = self.memo_key(tool, function_call)
+        hit, result = self.memo.get(key)
+        return key, hit, result
+
+    def execute(self, function_call, memoize: bool = True):
+        tool = self.tool(function_call)
+        if not (memoize and tool.deterministic):
+            return tool.function(function_call)
+        key, hit, result = self._lookup(tool, function_call)
+        if not hit:
+            result = tool.function(function_call)
+            self.memo.set(key, result)
+        return result
+
+    async def aexecute(self, function_call, executor=None, memoize: bool = True):
+        """Run the async implementation if there is one, otherwise the sync one on `executor`."""
+        tool = self.tool(function_call)
+        key = None
+        if memoize and tool.deterministic:
+            key, hit, result = self._lookup(tool, function_call)
+            if hit:
+                return result
+        if tool.async_function:
+            result = await tool.async_function(function_call)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(executor, tool.function, function_call)
+        if key is not None:
+            self.memo.set(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            **self.memo.stats(),
+            "deterministic_tools": sorted(tool.name for tool in self if tool.deterministic),
+        }
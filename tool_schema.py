@@ -0,0 +1,133 @@
+"""Compact tool definitions compiled from the pydantic input models.
+
+`model_json_schema()` output carries `$defs` references, titles, null
+branches of optional fields and the `function_type` discriminator (which
+the agent fills in from the tool name). `compact_schema` inlines the
+references and drops everything the model does not need, so the tools
+sent with every LLM call are a fraction of the size. Label enums used by
+several tools (the intents and categories) are listed once in the system
+prompt and named in the schemas instead of repeated. The output depends
+only on the models and descriptions, so the tool prefix of the prompt is
+byte-identical across calls and provider-side prompt caching applies.
+"""
+import hashlib
+import json
+import re
+
+from history import approx_tokens
+
+# Tools offered for every question when only relevant tools are sent
+CORE_TOOLS = (
+    "get_dataset_overview", "select_semantic_intent", "select_semantic_category",
+    "count_intent", "count_category", "value_distribution", "finish",
+)
+# Other tools, offered when a user message of the conversation matches their pattern
+TOOL_KEYWORDS = {
+    "intent_category_crosstab": r"\b(?:crosstab|cross tab|breakdown|within|each|per|by)\b",
+    "search_text": r"\b(?:search|mentions?|contains?|containing|words?|phrases?|texts?|says?)\b|\"",
+    "sum_values": r"\b(?:sum|total|add|plus|average|mean)\b",
+    "multiplication_float": r"\b(?:multipl\w*|times|product|percent\w*)\b|%",
+    "division_float": r"\b(?:divid\w*|ratio|share|percent\w*|proportion|fraction|average|mean)\b|%",
+    "show_examples": r"\b(?:examples?|samples?|show|display|instances?)\b",
+    "summarize_text": r"\b(?:summar\w*|respond\w*|responses?|tone|themes?)\b",
+}
+_TOOL_KEYWORDS = {name: re.compile(pattern) for name, pattern in TOOL_KEYWORDS.items()}
+
+# Keys of JSON schema nodes the model needs; anything else (title, $defs, ...) is dropped
+_SCHEMA_KEYS = ("type", "description", "enum", "const", "anyOf", "items", "properties", "required",
+                "minimum", "maximum", "minItems", "maxItems", "default")
+
+
+def _inline(node, defs: dict, listed: tuple = ()):
+    """`node` with every $ref replaced by its definition, or by a plain string for the `listed` enums."""
+    if isinstance(node, dict):
+        if "$ref" in node:
+            name = node["$ref"].rsplit("/", 1)[-1]
+            if name in listed:
+                return {"type": "string", "description": f"{name} label"}
+            return _inline(defs[name], defs, listed)
+        return {key: _inline(value, defs, listed) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_inline(item, defs, listed) for item in node]
+    return node
+
+
+def _compact(node: dict) -> dict:
+    alternatives = [_compact(option) for option in node.get("anyOf", []) if option.get("type") != "null"]
+    if len(alternatives) == 1:
+        node = {**alternatives[0], **{k: v for k, v in node.items() if k != "anyOf"}}
+    elif alternatives and all(option.get("type") == "string" and "enum" in option for option in alternatives):
+        # Optional union of string enums (CategoryClass | IntentClass) -> one enum
+        merged = {"type": "string", "enum": [value for option in alternatives for value in option["enum"]]}
+        node = {**merged, **{k: v for k, v in node.items() if k != "anyOf"}}
+    elif alternatives and all(option.keys() == {"type", "description"} and option["type"] == "string"
+                              for option in alternatives):
+        # Optional union of listed enums -> one string naming both label lists
+        merged = {"type": "string", "description": " or ".join(option["description"] for option in alternatives)}
+        node = {**merged, **{k: v for k, v in node.items() if k != "anyOf"}}
+    elif alternatives:
+        node = {**node, "anyOf": alternatives}
+
+    compact = {}
+    for key in _SCHEMA_KEYS:
+        if key not in node or (key == "default" and node[key] is None):
+            continue
+        value = node[key]
+        if key == "items":
+            value = _compact(value)
+        elif key == "properties":
+            value = {name: _compact(schema) for name, schema in value.items()}
+        compact[key] = value
+    return compact
+
+
+def compact_schema(model, listed_enums: tuple = ()) -> dict:
+    """Minimal self-contained parameters schema of a pydantic input model, without `function_type`.
+
+    Arguments of the `listed_enums` become plain strings naming the enum,
+    whose values are listed once in the system prompt (see `label_prompt`).
+    """
+    schema = model.model_json_schema()
+    listed = tuple(enum.__name__ for enum in listed_enums)
+    schema = _compact(_inline(schema, schema.get("$defs", {}), listed))
+    schema.setdefault("properties", {}).pop("function_type", None)
+    required = [name for name in schema.pop("required", []) if name != "function_type"]
+    if required:
+        schema["required"] = required
+    return schema
+
+
+def compile_tools(definitions: dict, listed_enums: tuple = ()) -> list:
+    """Tool definitions for the chat completions API from {name: (description, input model)}."""
+    return [
+        {"type": "function", "function": {"name": name, "description": description,
+                                          "parameters": compact_schema(model, listed_enums)}}
+        for name, (description, model) in definitions.items()
+    ]
+
+
+def label_prompt(listed_enums: tuple) -> str:
+    """System prompt section with the values of the enums the tool schemas refer to by name."""
+    lines = [f"- {enum.__name__}: {', '.join(item.value for item in enum)}" for enum in listed_enums]
+    return "Valid values of the label arguments of the tools:\n" + "\n".join(lines) + "\n"
+
+
+def _serialized(tool: dict) -> str:
+    return json.dumps(tool, ensure_ascii=False, separators=(",", ":"))
+
+
+def tool_tokens(tools: list) -> dict:
+    """Approximate prompt tokens of each tool definition."""
+    return {tool["function"]["name"]: approx_tokens(_serialized(tool)) for tool in tools}
+
+
+def tools_digest(tools: list) -> str:
+    """Short hash of the serialized tools; it only changes when a definition changes."""
+    return hashlib.sha256("\n".join(_serialized(tool) for tool in tools).encode()).hexdigest()[:12]
+
+
+def relevant_tools(tools: list, messages: list) -> list:
+    """The core tools plus those whose keywords appear in a user message, in their original order."""
+    text = "\n".join((m.get("content") or "").casefold() for m in messages if m.get("role") == "user")
+    wanted = set(CORE_TOOLS) | {name for name, pattern in _TOOL_KEYWORDS.items() if pattern.search(text)}
+    return [tool for tool in tools if tool["function"]["name"] in wanted]
@@ -1,5 +1,7 @@
-from config import df_csdataset, client, model_name
-import pandas as pd
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from config import runtime
+from llm_cache import make_key, normalize_query
 from model import (
                    IntentClass,
                    CategoryClass,
@@ -7,6 +9,9 @@ from model import (
                    SelectSemanticIntent, 
                    SelectSemanticCategory, 
                    CountIntent, CountCategory, 
+                   ValueDistribution, 
+                   IntentCategoryCrosstab, 
+                   SearchText, 
                    SumValues, 
                    MultiplicationFloat, 
                    DivisionFloat, 
@@ -21,6 +26,7 @@ from model import (
 
 def get_dataset_overview(_: DatasetOverview) -> dict:
     """Get dataset overview."""
+    backend = runtime.backend
     return {
         "dataset_name": "Bitext Customer Support Dataset",
         "description": "Customer Service Tagged Training Dataset for LLM-based Virtual Assistants.",
@@ -30,17 +36,42 @@ def get_dataset_overview(_: DatasetOverview) -> dict:
             "category": "High-level semantic category for intent (e.g., ORDER, DELIVERY).",
             "responce": "Example expected assistant response."
         },
-        "number of rows in the dataset": len(df_csdataset),
-        "number of unique intents": len(df_csdataset["intent"].unique()),
-        "number of unique categories": len(df_csdataset["category"].unique())
+        "number of rows in the dataset": len(backend),
+        "number of unique intents": backend.unique_count("intent"),
+        "number of unique categories": backend.unique_count("category")
     }
 
 
-def select_semantic_intent(input_data: SelectSemanticIntent) -> dict:
-    """Uses LLM to select the most appropriate intent based on a text description."""
-    global df_csdataset
+def _fast_classification(query: str, labels: type, field: str) -> tuple[str, dict]:
+    """Try the local classifier, then labels chosen earlier by the LLM for the same query.
 
-    query = input_data.query
+    Returns the cache key for storing an LLM answer and a ready result, or None
+    when the LLM has to be asked.
+    """
+    possible_labels = [label.value for label in labels]
+    classifiers = runtime.get("classifiers", wait=False)  # None while they are still being trained
+    prediction = classifiers[field].predict(query) if classifiers else {"confident": False}
+    if prediction["confident"] and prediction["label"] in possible_labels:
+        return None, {
+            "query": query,
+            "selected_intent": prediction["label"],
+            "decision_path": "local_classifier",
+            "confidence": prediction["margin"]
+        }
+
+    cache_key = make_key(normalize_query(query), runtime.model_name, possible_labels)
+    cached_label = runtime.classification_cache.get(cache_key)
+    if cached_label is None:
+        return cache_key, None
+    return cache_key, {"query": query, "selected_intent": cached_label, "decision_path": "cache"}
+
+def _store_classification(cache_key: str, result: dict) -> dict:
+    if "error" not in result:
+        runtime.classification_cache.set(cache_key, result["selected_intent"])
+    return {**result, "decision_path": "llm"}
+
+
+def _intent_messages(query: str) -> list:
     possible_intents = [intent.value for intent in IntentClass]
 
     system_prompt = (
@@ -52,22 +83,16 @@ def select_semantic_intent(input_data: SelectSemanticIntent) -> dict:
 
     user_query = f"User query: {query}"
 
-    messages = [
+    return [
         {"role": "system",
          "content": system_prompt},
         {"role": "user", "content": user_query}
     ]
 
-    
-    response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0
-        )
-    
-    selected_intent = response.choices[0].message.content.strip()
+def _intent_result(query: str, llm_response: str) -> dict:
+    selected_intent = llm_response.strip()
 
-    if selected_intent not in possible_intents:
+    if selected_intent not in [intent.value for intent in IntentClass]:
         return {
             "query": query,
             "error": "LLM was unable to select a valid intent",
@@ -79,10 +104,38 @@ def select_semantic_intent(input_data: SelectSemanticIntent) -> dict:
         "selected_intent": selected_intent
     }
 
-def select_semantic_category(input_data: SelectSemanticCategory) -> dict:
-    """Uses LLM to select the most appropriate category based on a text description."""
-    global df_csdataset
+def select_semantic_intent(input_data: SelectSemanticIntent) -> dict:
+    """Selects the most appropriate intent for a text description (local classifier, cache, then LLM)."""
+    query = input_data.query
+    cache_key, fast_result = _fast_classification(query, IntentClass, "intent")
+    if fast_result:
+        return fast_result
+
+    response = runtime.client.chat.completions.create(
+            model=runtime.model_name,
+            messages=_intent_messages(query),
+            temperature=0
+        )
+
+    return _store_classification(cache_key, _intent_result(query, response.choices[0].message.content))
+
+async def aselect_semantic_intent(input_data: SelectSemanticIntent) -> dict:
+    """Async version of select_semantic_intent."""
     query = input_data.query
+    cache_key, fast_result = _fast_classification(query, IntentClass, "intent")
+    if fast_result:
+        return fast_result
+
+    response = await runtime.async_client.chat.completions.create(
+            model=runtime.model_name,
+            messages=_intent_messages(query),
+            temperature=0
+        )
+
+    return _store_classification(cache_key, _intent_result(query, response.choices[0].message.content))
+
+
+def _category_messages(query: str) -> list:
     possible_category = [category.value for category in CategoryClass]
 
     system_prompt = (
@@ -94,22 +147,16 @@ def select_semantic_category(input_data: SelectSemanticCategory) -> dict:
 
     user_query = f"User query: {query}"
 
-    messages = [
+    return [
         {"role": "system",
          "content": system_prompt},
         {"role": "user", "content": user_query}
     ]
 
-    
-    response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0
-        )
-    
-    selected_category = response.choices[0].message.content.strip()
+def _category_result(query: str, llm_response: str) -> dict:
+    selected_category = llm_response.strip()
 
-    if selected_category not in possible_category:
+    if selected_category not in [category.value for category in CategoryClass]:
         return {
             "query": query,
             "error": "LLM was unable to select a valid category",
@@ -121,25 +168,134 @@ def select_semantic_category(input_data: SelectSemanticCategory) -> dict:
         "selected_intent": selected_category
     }
 
+def select_semantic_category(input_data: SelectSemanticCategory) -> dict:
+    """Selects the most appropriate category for a text description (local classifier, cache, then LLM)."""
+    query = input_data.query
+    cache_key, fast_result = _fast_classification(query, CategoryClass, "category")
+    if fast_result:
+        return fast_result
+
+    response = runtime.client.chat.completions.create(
+            model=runtime.model_name,
+            messages=_category_messages(query),
+            temperature=0
+        )
+
+    return _store_classification(cache_key, _category_result(query, response.choices[0].message.content))
+
+async def aselect_semantic_category(input_data: SelectSemanticCategory) -> dict:
+    """Async version of select_semantic_category."""
+    query = input_data.query
+    cache_key, fast_result = _fast_classification(query, CategoryClass, "category")
+    if fast_result:
+        return fast_result
+
+    response = await runtime.async_client.chat.completions.create(
+            model=runtime.model_name,
+            messages=_category_messages(query),
+            temperature=0
+        )
+
+    return _store_classification(cache_key, _category_result(query, response.choices[0].message.content))
+
 
 def count_intent(input_data: CountIntent) -> dict:
     """Count of rows for particular intent."""
-    global df_csdataset
     intent_value = input_data.intent_class.value
 
-    filtered_df = df_csdataset[df_csdataset["intent"] == intent_value]
-
-    return {"selected intent": intent_value, "number of rows": len(filtered_df)}
+    return {"selected intent": intent_value, "number of rows": runtime.backend.count("intent", intent_value)}
 
 
 def count_category(input_data: CountCategory) -> dict:
     """Count of rows for particular category."""
-    global df_csdataset
     category_value = input_data.category_class.value
 
-    filtered_df = df_csdataset[df_csdataset["category"] == category_value]
+    return {"selected intent": category_value, "number of rows": runtime.backend.count("category", category_value)}
+
+
+def _condition_error(condition_field: str, condition_field_value) -> dict:
+    """Error result when the condition value does not belong to the condition field."""
+    if condition_field == "intent" and not isinstance(condition_field_value, IntentClass):
+        return {"error": f"Expected IntentClass for field 'intent', got {type(condition_field_value).__name__}"}
+    if condition_field == "category" and not isinstance(condition_field_value, CategoryClass):
+        return {"error": f"Expected CategoryClass for field 'category', got {type(condition_field_value).__name__}"}
+    return None
+
 
-    return {"selected intent": category_value, "number of rows": len(filtered_df)}
+def value_distribution(input_data: ValueDistribution) -> dict:
+    """Counts and shares of all (or the top-k) intents or categories, optionally within one group."""
+    backend = runtime.backend
+    field = input_data.field.value
+    condition_field = input_data.condition_field.value if input_data.condition_field else None
+    condition_field_value = input_data.condition_field_value.value if input_data.condition_field_value else None
+
+    if condition_field:
+        error = _condition_error(condition_field, input_data.condition_field_value)
+        if error:
+            return error
+        condition_status = f"{condition_field} = {condition_field_value}"
+    else:
+        condition_status = "no condition (full dataset)"
+
+    pairs = backend.distribution(field, condition_field, condition_field_value)
+    total = sum(n for _, n in pairs)
+    if total == 0:
+        return {"error": f"No rows match condition: {condition_status}"}
+    shown = pairs[:input_data.top_k] if input_data.top_k else pairs
+
+    return {
+        "field": field,
+        "by condition": condition_status,
+        "total rows": total,
+        "distinct values": len(pairs),
+        "columns": ["value", "rows", "share %"],
+        "distribution": [[label, n, round(100 * n / total, 2)] for label, n in shown]
+    }
+
+
+def intent_category_crosstab(input_data: IntentCategoryCrosstab) -> dict:
+    """Number of rows for every intent within every category (or within one category)."""
+    intents_by_category = runtime.backend.crosstab_counts()
+    categories = [input_data.category_class.value] if input_data.category_class else list(intents_by_category)
+
+    crosstab = {
+        category: dict(intents_by_category[category])
+        for category in categories if category in intents_by_category
+    }
+
+    return {
+        "rows by category and intent": crosstab,
+        "category totals": {category: sum(intents.values()) for category, intents in crosstab.items()}
+    }
+
+
+def search_text(input_data: SearchText) -> dict:
+    """Count and show rows whose instruction or response text matches a boolean/phrase query."""
+    search_field = input_data.search_field.value if input_data.search_field else "instruction"
+    condition_field = input_data.condition_field.value if input_data.condition_field else None
+    condition_field_value = input_data.condition_field_value.value if input_data.condition_field_value else None
+
+    condition_status = "no condition (full dataset)"
+    if condition_field and condition_field_value:
+        error = _condition_error(condition_field, input_data.condition_field_value)
+        if error:
+            return error
+        condition_status = f"{condition_field} = {condition_field_value}"
+    else:
+        condition_field = condition_field_value = None
+
+    found = runtime.backend.search(input_data.query, search_field, condition_field, condition_field_value,
+                                   input_data.number_rows)
+
+    return {
+        "query": input_data.query,
+        "searched field": search_field,
+        "by condition": condition_status,
+        "matching rows": found["matches"],
+        "share of rows %": round(100 * found["matches"] / found["scope"], 2) if found["scope"] else 0.0,
+        "top intents": found["top_intents"],
+        "examples": found["examples"]
+    }
 
 
 def sum_values(input_data: SumValues) -> dict:
@@ -160,79 +316,192 @@ def division_float(input_data: DivisionFloat) -> float:
 
 
 def show_examples(input_data: ShowExamples) -> dict:
-    """Show n rows of dataset with or without conditions on selected Inent and Order."""
-    global df_csdataset
-    n = input_data.number_rows
+    """Show n random rows of dataset with or without conditions on selected Inent and Order.
+
+    Rows come from the precomputed shuffled order of the group, so page p
+    holds the next n examples after page p-1 without repeats.
+    """
+    backend = runtime.backend
+    n = max(0, input_data.number_rows)
     target_field = input_data.target_field.value if input_data.target_field else None
     condition_field = input_data.condition_field.value if input_data.condition_field else None
     condition_field_value = input_data.condition_field_value.value if input_data.condition_field_value else None
     
     if isinstance(input_data.condition_field_value, IntentClass):
-        df_source = df_csdataset[df_csdataset["intent"] == condition_field_value]
+        group_field = "intent"
         condition_status = f"{condition_field} = {condition_field_value}"
 
     elif isinstance(input_data.condition_field_value, CategoryClass):
-        df_source = df_csdataset[df_csdataset["category"] == condition_field_value]
+        group_field = "category"
         condition_status = f"{condition_field} = {condition_field_value}"
 
     else:
-        df_source = df_csdataset
+        group_field = None
         condition_status = "no condition (full dataset)"
 
-    if target_field:
-        df_sample = df_source[[target_field]].sample(n=min(n, len(df_source)), random_state=42)
-    else:
-        df_sample = df_source.sample(n=min(n, len(df_source)), random_state=42)
+    offset = input_data.page * n
+    df_sample = backend.sample(n, offset, group_field, condition_field_value,
+                               columns=[target_field] if target_field else None)
+    remaining = max(0, backend.group_size(group_field, condition_field_value) - offset - len(df_sample))
 
     return {
         "by condition": condition_status,
+        "page": input_data.page,
         "number of examples shown": len(df_sample),
-        "examples": df_sample.to_dict(orient="records")
+        "examples": df_sample.to_dict(orient="records"),
+        "more examples available": remaining
     }
 
 
-def summarize_text(input_data: SummarizeText) -> dict:
-    """Summarize text from unstructured field (instruction or response) using AI summarization."""
-    global df_csdataset
+# Row limits and chunking for summarize_text
+SAMPLE_MAX_ROWS = 100
+MAP_REDUCE_MAX_ROWS = 2000
+CHUNK_TOKEN_BUDGET = 3000
+MAP_CONCURRENCY = 8
+summary_executor = ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="summary")
+
+
+def _approx_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _chunk_lines(lines: list, token_budget: int = CHUNK_TOKEN_BUDGET) -> list:
+    """Split lines into consecutive chunks of at most `token_budget` approximate tokens."""
+    chunks, chunk, used = [], [], 0
+    for line in lines:
+        tokens = _approx_tokens(line)
+        if chunk and used + tokens > token_budget:
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(line)
+        used += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _reduce_groups(summaries: list) -> list:
+    """Group partial summaries for the next reduce round; always makes progress."""
+    groups = _chunk_lines(summaries)
+    return groups if len(groups) < len(summaries) else [summaries]
+
+def _summary_prompt(lines: list) -> str:
+    text = "\n".join(f"- {line}" for line in lines)
+    return f"""Here is a list of messages:\n{text}\n\nProvide a brief summary of the main themes they raise:"""
+
+def _reduce_prompt(summaries: list) -> str:
+    text = "\n\n".join(f"Summary {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    return f"""Here are summaries of several groups of messages:\n{text}\n\nCombine them into one brief summary of the main themes they raise:"""
+
+def _prepare_summary(input_data: SummarizeText) -> dict:
+    """Select the rows to summarize; returns the lines, result fields and cache key, or an error."""
+    backend = runtime.backend
     text_field = input_data.text_field.value if input_data.text_field else "instruction"
-    number_rows = min(input_data.number_rows, 100)
+    max_rows = MAP_REDUCE_MAX_ROWS if input_data.mode == "map_reduce" else SAMPLE_MAX_ROWS
+    number_rows = min(input_data.number_rows, max_rows)
     condition_field = input_data.condition_field.value if input_data.condition_field else None
     condition_field_value = input_data.condition_field_value.value if input_data.condition_field_value else None 
 
-    if condition_field == "intent" and not isinstance(input_data.condition_field_value, IntentClass):
-        return {"error": f"Expected IntentClass for field 'intent', got {type(input_data.condition_field_value).__name__}"}
-    if condition_field == "category" and not isinstance(input_data.condition_field_value, CategoryClass):
-        return {"error": f"Expected CategoryClass for field 'category', got {type(input_data.condition_field_value).__name__}"}
+    error = _condition_error(condition_field, input_data.condition_field_value) if condition_field else None
+    if error:
+        return error
 
     if condition_field and condition_field_value:
-        df_filtered = df_csdataset[df_csdataset[condition_field] == condition_field_value]
         condition_status = f"{condition_field} = {condition_field_value}"
     else:
         return {"error": "User query should be more specified in terms of Category or Intent"}
 
-    available_rows = len(df_filtered)
+    available_rows = backend.count(condition_field, condition_field_value)
     if available_rows == 0:
         return {"error": f"No rows match condition: {condition_status}"}
-    
-    nmin = min(number_rows, available_rows)
 
-    df_sample = df_filtered.sample(n=nmin, random_state=42)
-    text = "\n".join(f"- {line}" for line in df_sample[text_field])
+    df_sample = backend.sample(number_rows, input_data.page * number_rows, condition_field, condition_field_value,
+                               columns=[text_field], seed=input_data.seed)
+    if len(df_sample) == 0:
+        return {"error": f"No more rows for page {input_data.page}: {condition_status} has {available_rows} rows"}
 
-    prompt = f"""Here is a list of messages:\n{text}\n\nProvide a brief summary of the main themes they raise:"""
+    return {
+        "lines": [str(line) for line in df_sample[text_field]],
+        "cache_key": make_key(text_field, condition_status, number_rows, input_data.page, input_data.seed,
+                              input_data.mode, runtime.model_name, backend.version),
+        "result": {
+            "summarized_field": text_field,
+            "conditions": condition_status,
+            "page": input_data.page,
+            "number of samples": len(df_sample),
+            "mode": input_data.mode
+        }
+    }
 
-    response = client.chat.completions.create(
-        model=model_name,
+def _complete_summary(prompt: str) -> str:
+    response = runtime.client.chat.completions.create(
+        model=runtime.model_name,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.5
     )
+    return response.choices[0].message.content.strip()
+
+async def _acomplete_summary(prompt: str, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        response = await runtime.async_client.chat.completions.create(
+            model=runtime.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5
+        )
+    return response.choices[0].message.content.strip()
 
-    return {
-        "summarized_field": text_field,
-        "conditions": condition_status,
-        "number of samples": nmin,
-        "summary": response.choices[0].message.content.strip()
-    }
+
+def summarize_text(input_data: SummarizeText) -> dict:
+    """Summarize text from unstructured field (instruction or response) using AI summarization.
+
+    In map_reduce mode the sample is split into token-budgeted chunks that are
+    summarized concurrently and then reduced (repeatedly, if needed) to one summary.
+    """
+    prepared = _prepare_summary(input_data)
+    if "error" in prepared:
+        return prepared
+
+    result = prepared["result"]
+    cached_summary = runtime.summary_cache.get(prepared["cache_key"])
+    if cached_summary is not None:
+        return {**result, **cached_summary, "cached": True}
+
+    if input_data.mode == "map_reduce":
+        chunks = _chunk_lines(prepared["lines"])
+        summaries = list(summary_executor.map(_complete_summary, [_summary_prompt(c) for c in chunks]))
+        while len(summaries) > 1:
+            groups = _reduce_groups(summaries)
+            summaries = list(summary_executor.map(_complete_summary, [_reduce_prompt(g) for g in groups]))
+        summary = {"number of chunks": len(chunks), "summary": summaries[0]}
+    else:
+        summary = {"summary": _complete_summary(_summary_prompt(prepared["lines"]))}
+
+    runtime.summary_cache.set(prepared["cache_key"], summary)
+    return {**result, **summary}
+
+
+async def asummarize_text(input_data: SummarizeText) -> dict:
+    """Async version of summarize_text."""
+    prepared = _prepare_summary(input_data)
+    if "error" in prepared:
+        return prepared
+
+    result = prepared["result"]
+    cached_summary = runtime.summary_cache.get(prepared["cache_key"])
+    if cached_summary is not None:
+        return {**result, **cached_summary, "cached": True}
+
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+    if input_data.mode == "map_reduce":
+        chunks = _chunk_lines(prepared["lines"])
+        summaries = await asyncio.gather(*(_acomplete_summary(_summary_prompt(c), semaphore) for c in chunks))
+        while len(summaries) > 1:
+            groups = _reduce_groups(summaries)
+            summaries = await asyncio.gather(*(_acomplete_summary(_reduce_prompt(g), semaphore) for g in groups))
+        summary = {"number of chunks": len(chunks), "summary": summaries[0]}
+    else:
+        summary = {"summary": await _acomplete_summary(_summary_prompt(prepared["lines"]), semaphore)}
+
+    runtime.summary_cache.set(prepared["cache_key"], summary)
+    return {**result, **summary}
 
 
 def finish(input_data: Finish) -> str:
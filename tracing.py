@@ -0,0 +1,223 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+
+def _span_id() -> str:
+    return secrets.token_hex(8)
+
+
+@dataclass
+class ToolSpan:
+    name: str
+    tool_call_id: str
+    start_ns: int
+    duration_ms: float = 0.0
+    result_chars: int = 0
+    truncated: bool = False
+    error: Optional[str] = None
+    span_id: str = field(default_factory=_span_id)
+
+
+@dataclass
+class StepSpan:
+    index: int
+    start_ns: int
+    llm_latency_ms: float = 0.0
+    duration_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    request_messages: int = 0
+    request_chars: int = 0
+    request_tools: int = 0
+    tools_tokens: int = 0
+    tools: list = field(default_factory=list)
+    span_id: str = field(default_factory=_span_id)
+
+
+@dataclass
+class RunTrace:
+    """Record of one agent run: every ReAct step with its LLM call and tool executions."""
+    question: str = ""
+    mode: str = "react"
+    trace_id: str = field(default_factory=lambda: secrets.token_hex(16))
+    start_ns: int = field(default_factory=time.time_ns)
+    duration_ms: float = 0.0
+    answer_chars: int = 0
+    error: Optional[str] = None
+    fallback: Optional[str] = None
+    steps: list = field(default_factory=list)
+    span_id: str = field(default_factory=_span_id)
+
+    def start_step(self) -> StepSpan:
+        step = StepSpan(index=len(self.steps), start_ns=time.time_ns())
+        self.steps.append(step)
+        return step
+
+    def totals(self) -> dict:
+        tools = [tool for step in self.steps for tool in step.tools]
+        return {
+            "steps": len(self.steps),
+            "duration_ms": round(self.duration_ms, 1),
+            "llm_ms": round(sum(step.llm_latency_ms for step in self.steps), 1),
+            "tool_calls": len(tools),
+            "tool_errors": sum(1 for tool in tools if tool.error),
+            "prompt_tokens": sum(step.prompt_tokens for step in self.steps),
+            "completion_tokens": sum(step.completion_tokens for step in self.steps),
+        }
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "totals": self.totals()}
+
+    def to_otlp(self, service_name: str = "react-agent") -> dict:
+        """The trace in OpenTelemetry OTLP/JSON layout (run → step → tool spans)."""
+        spans = [_otlp_span(self.trace_id, self.span_id, None, "agent.run", self.start_ns, self.duration_ms, {
+            "agent.mode": self.mode,
+            "agent.question": self.question,
+            "agent.answer_chars": self.answer_chars,
+            "agent.fallback": self.fallback,
+            "error.message": self.error,
+        })]
+        for step in self.steps:
+            spans.append(_otlp_span(self.trace_id, step.span_id, self.span_id, "agent.step", step.start_ns, step.duration_ms, {
+                "agent.step.index": step.index,
+                "llm.latency_ms": step.llm_latency_ms,
+                "llm.usage.prompt_tokens": step.prompt_tokens,
+                "llm.usage.completion_tokens": step.completion_tokens,
+                "llm.request.messages": step.request_messages,
+                "llm.request.chars": step.request_chars,
+                "llm.request.tools": step.request_tools,
+                "llm.request.tools_tokens": step.tools_tokens,
+            }))
+            for tool in step.tools:
+                spans.append(_otlp_span(self.trace_id, tool.span_id, step.span_id, f"tool.{tool.name}", tool.start_ns, tool.duration_ms, {
+                    "tool.call_id": tool.tool_call_id,
+                    "tool.result_chars": tool.result_chars,
+                    "tool.result_truncated": tool.truncated,
+                    "error.message": tool.error,
+                }))
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": "react_agent"}, "spans": spans}],
+        }]}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    result = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+
+def _otlp_span(trace_id: str, span_id: str, parent_id: Optional[str], name: str,
+               start_ns: int, duration_ms: float, attributes: dict) -> dict:
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(duration_ms * 1e6)),
+        "attributes": _otlp_attributes(attributes),
+    }
+    if parent_id:
+        span["parentSpanId"] = parent_id
+    if attributes.get("error.message"):
+        span["status"] = {"code": 2, "message": attributes["error.message"]}
+    return span
+
+
+class Metrics:
+    """Process-wide counters and latency samples with p50/p95 summaries.
+
+    Each metric keeps its last `window` observations.
+    """
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counters = {}
+        self.window = window
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(value)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record_run(self, trace: RunTrace) -> None:
+        totals = trace.totals()
+        self.increment("runs")
+        self.increment("steps", totals["steps"])
+        self.increment("tool_calls", totals["tool_calls"])
+        self.increment("tool_errors", totals["tool_errors"])
+        self.increment("prompt_tokens", totals["prompt_tokens"])
+        self.increment("completion_tokens", totals["completion_tokens"])
+        if trace.error:
+            self.increment("run_errors")
+        if trace.fallback:
+            self.increment("plan_fallbacks")
+        self.observe("run_ms", trace.duration_ms)
+        self.observe(f"run_ms.{trace.mode}", trace.duration_ms)
+        self.observe("steps_per_run", totals["steps"])
+        self.observe(f"steps_per_run.{trace.mode}", totals["steps"])
+        for step in trace.steps:
+            self.observe("llm_ms", step.llm_latency_ms)
+            for tool in step.tools:
+                self.observe(f"tool_ms.{tool.name}", tool.duration_ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "latency": {
+                name: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 0.50), 2),
+                    "p95": round(percentile(values, 0.95), 2),
+                }
+                for name, values in samples.items() if values
+            },
+        }
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return float(sorted_values[index])
+
+
+_export_lock = threading.Lock()
+
+
+def export_trace(trace: RunTrace, path: str = None, fmt: str = None) -> None:
+    """Append the trace as one JSON line (AGENT_TRACE_PATH, format AGENT_TRACE_FORMAT=json|otlp)."""
+    path = path or os.environ.get("AGENT_TRACE_PATH")
+    if not path:
+        return
+    fmt = fmt or os.environ.get("AGENT_TRACE_FORMAT", "json")
+    record = trace.to_otlp() if fmt == "otlp" else trace.to_dict()
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _export_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+# Global metrics shared by every session in the process
+metrics = Metrics()
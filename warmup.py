@@ -0,0 +1,109 @@
+"""Background warm-up of the shared resources at app start.
+
+Loads the dataset with its counts and group indexes, the search index, the
+local classifiers and the tool schemas in a daemon thread, and optionally
+pre-summarizes the responses of the largest intents and categories through
+`summarize_text` so their summaries are cached. Requests arriving earlier
+are served as usual: they build what they need themselves, and optional
+resources still being built (the classifiers) are skipped instead of awaited.
+"""
+import os
+import threading
+import time
+
+from pydantic import ValidationError
+
+from config import runtime
+from dataset_index import GROUP_FIELDS
+from model import FunctionInput
+
+# Largest intents and categories summarized at start-up (WARMUP_SUMMARIES; 0 = none, as it costs LLM calls)
+WARMUP_SUMMARIES = 0
+
+
+class WarmUp:
+    """Runs the warm-up steps once in a background thread and reports their progress."""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self.state = "pending"
+        self.current = None
+        self.steps = {}
+        self.total = 0
+
+    def start(self, summaries: int = None) -> "WarmUp":
+        """Start the warm-up unless it is already running or done (WARMUP=0 disables it)."""
+        if os.environ.get("WARMUP", "1") == "0":
+            return self
+        if summaries is None:
+            summaries = int(os.environ.get("WARMUP_SUMMARIES", WARMUP_SUMMARIES))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(summaries,), name="warmup", daemon=True)
+                self.state = "running"
+                self._thread.start()
+        return self
+
+    def _steps(self, summaries: int) -> list:
+        """(name, build) of the steps after the dataset is loaded."""
+        from data_backend import PandasBackend
+        from react_agent import execute_function
+
+        steps = []
+        if isinstance(runtime.backend, PandasBackend):
+            steps.append(("search_index", lambda: runtime.search_index))
+        steps += [("classifiers", lambda: runtime.classifiers), ("tools", lambda: runtime.tools)]
+
+        for field in GROUP_FIELDS:
+            for label, _ in runtime.backend.distribution(field)[:summaries]:
+                try:
+                    function_call = FunctionInput(function_call={
+                        "function_type": "summarize_text", "text_field": "response",
+                        "condition_field": field, "condition_field_value": label,
+                    }).function_call
+                except ValidationError:
+                    continue
+                steps.append((f"summary {field}={label}", lambda call=function_call: execute_function(call)))
+        return steps
+
+    def _run(self, summaries: int) -> None:
+        self.total = 1
+        if not self._step("dataset", lambda: runtime.backend):
+            self.state = "failed"
+            return
+        steps = self._steps(summaries)
+        self.total += len(steps)
+        results = [self._step(name, build) for name, build in steps]
+        self.current = None
+        self.state = "ready" if all(results) else "failed"
+
+    def _step(self, name: str, build) -> bool:
+        self.current = name
+        started = time.perf_counter()
+        try:
+            build()
+            self.steps[name] = {"state": "done", "seconds": round(time.perf_counter() - started, 2)}
+            return True
+        except Exception as e:
+            self.steps[name] = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+            return False
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> dict:
+        """State ("pending", "running", "ready" or "failed"), the running step, progress and per-step results."""
+        steps = dict(self.steps)
+        return {
+            "state": self.state,
+            "current": self.current,
+            "done": sum(1 for step in steps.values() if step["state"] == "done"),
+            "total": self.total,
+            "steps": steps,
+        }
+
+
+# The warm-up of this process
+warmup = WarmUp()